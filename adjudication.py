@@ -0,0 +1,110 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Early adjudication of games whose result is settled.
+
+Games often go on long after the winner is clear, until both players pass or
+max_game_length is reached. A game is adjudicated once, for a number of
+consecutive moves, both the search and a score estimate that respects
+pass-alive (Benson) territory agree on the winner.
+
+To measure how often adjudication is wrong, a fraction of the games are
+played out anyway; their SGFs record the adjudication that would have been
+made, to be compared with the real result by holdout_accuracy.
+"""
+
+import re
+
+from absl import flags
+
+import go
+
+flags.DEFINE_integer('adjudicate_moves', 0,
+                     'Adjudicate a game once the root Q and the pass-alive '
+                     'score estimate have agreed on the winner for this many '
+                     'consecutive moves. 0 disables adjudication.')
+flags.register_validator('adjudicate_moves', lambda x: x >= 0)
+
+flags.DEFINE_float('adjudicate_q', 0.9,
+                   'Minimum magnitude of the root Q for adjudication.')
+flags.register_validator('adjudicate_q', lambda x: 0 <= x <= 1)
+
+flags.DEFINE_float('adjudicate_holdout_pct', 0.1,
+                   'Fraction of selfplay games that are played out even '
+                   'when they could be adjudicated, to measure accuracy.')
+flags.register_validator('adjudicate_holdout_pct', lambda x: 0 <= x <= 1)
+
+FLAGS = flags.FLAGS
+
+# SGF comment recording the adjudication of a holdout game.
+HOLDOUT_COMMENT = "Adjudication holdout: {} at move {}\n"
+HOLDOUT_RE = re.compile(r"Adjudication holdout: ([BW]) at move (\d+)")
+RESULT_RE = re.compile(r"RE\[([BWbw])\+")
+
+
+class Adjudicator(object):
+    """Tracks the agreement of the search and the score estimate in one game.
+
+    num_moves: the number of consecutive moves they need to agree for.
+        Defaults to --adjudicate_moves.
+    q_threshold: the minimum magnitude of Q. Defaults to --adjudicate_q.
+    """
+
+    def __init__(self, num_moves=None, q_threshold=None):
+        self.num_moves = num_moves or FLAGS.adjudicate_moves
+        self.q_threshold = (FLAGS.adjudicate_q if q_threshold is None
+                            else q_threshold)
+        self.winner = 0
+        self.streak = 0
+
+    def update(self, position, q):
+        """Adds the root Q of the search at position.
+
+        Returns:
+            The winner (go.BLACK or go.WHITE) if the game can be adjudicated,
+            or 0.
+        """
+        winner = 0
+        if abs(q) >= self.q_threshold:
+            winner = go.BLACK if q > 0 else go.WHITE
+            # Only score the position if the search is confident.
+            score = position.estimated_score()
+            if score * winner <= 0:
+                winner = 0
+        if winner and winner == self.winner:
+            self.streak += 1
+        else:
+            self.winner = winner
+            self.streak = 1 if winner else 0
+        return self.winner if self.streak >= self.num_moves else 0
+
+
+def holdout_accuracy(sgf_contents):
+    """Compares the adjudications recorded in holdout games with their real
+    results.
+
+    Returns:
+        (number of holdout games that would have been adjudicated, number of
+        those that were adjudicated correctly)
+    """
+    total = correct = 0
+    for contents in sgf_contents:
+        adjudicated = HOLDOUT_RE.search(contents)
+        result = RESULT_RE.search(contents)
+        if not adjudicated or not result:
+            continue
+        total += 1
+        if adjudicated.group(1) == result.group(1).upper():
+            correct += 1
+    return total, correct
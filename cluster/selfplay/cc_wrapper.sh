@@ -33,6 +33,9 @@ GAMES=`gsutil ls "gs://$BUCKET_NAME/data/selfplay/$BASENAME/*.zz" | wc -l`
 
 gsutil cp $MODEL_FILE .
 
+# Use the threshold published by `rl_loop.py calibrate_resign`, if any.
+RESIGN_THRESHOLD=`gsutil cat "gs://$BUCKET_NAME/config/resign_threshold" 2>/dev/null || echo 0.88`
+
 if [ $GAMES -lt 25000 ];
 then
   echo Playing $NAME
@@ -40,7 +43,7 @@ then
     --model=$NAME \
     --num_readouts=800 \
     --mode=selfplay \
-    --resign_threshold=0.88 \
+    --resign_threshold=$RESIGN_THRESHOLD \
     --output_dir="gs://$BUCKET_NAME/data/selfplay/$BASENAME" \
     --sgf_dir="gs://$BUCKET_NAME/sgf/$BASENAME"
   echo Finished a set of games!
@@ -22,9 +22,9 @@ echo creds: $GOOGLE_APPLICATION_CREDENTIALS
 echo bucket: $BUCKET_NAME
 echo board_size: $BOARD_SIZE
 
+# The resign threshold is calibrated by `rl_loop.py calibrate_resign`.
 python3 rl_loop.py selfplay \
   --bucket_name=$BUCKET_NAME \
-  --resign-threshold=0.88 \
   --num_readouts=900
 
 echo Finished a set of games!
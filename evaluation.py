@@ -19,6 +19,7 @@ import time
 from absl import flags
 from tensorflow import gfile
 
+import adjudication
 from gtp_wrapper import MCTSPlayer
 import sgf_wrapper
 
@@ -48,6 +49,9 @@ def play_match(black_net, white_net, games, sgf_dir, verbosity):
 
         black.initialize_game()
         white.initialize_game()
+        adjudicator = None
+        if flags.FLAGS.adjudicate_moves:
+            adjudicator = adjudication.Adjudicator()
 
         while True:
             start = time.time()
@@ -68,6 +72,14 @@ def play_match(black_net, white_net, games, sgf_dir, verbosity):
                                   active.root.position.to_play, was_resign=True)
                 inactive.set_result(
                     active.root.position.to_play, was_resign=True)
+            elif adjudicator is not None:
+                winner = adjudicator.update(active.root.position,
+                                            active.root.Q)
+                if winner:
+                    active.set_result(winner, was_resign=False,
+                                      was_adjudicated=True)
+                    inactive.set_result(winner, was_resign=False,
+                                        was_adjudicated=True)
 
             if active.is_done():
                 fname = "{:d}-{:s}-vs-{:s}-{:d}.sgf".format(int(time.time()),
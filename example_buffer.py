@@ -23,7 +23,23 @@ READ_OPTS = preprocessing.TF_RECORD_CONFIG
 LOCAL_DIR = "data/"
 
 
+def pick_examples_from_game_record(filename, samples_per_game=4):
+    tf_examples = []
+    for record in preprocessing.read_game_records(filename):
+        if len(record.moves) < 20:  # Filter games with less than 20 moves
+            continue
+        num_examples = len(record.example_moves)
+        choices = random.sample(range(num_examples),
+                                min(num_examples, samples_per_game))
+        # Only the sampled positions are replayed and featurized.
+        tf_examples.extend(
+            preprocessing.make_examples_from_game_record(record, choices))
+    return tf_examples
+
+
 def pick_examples_from_tfrecord(filename, samples_per_game=4):
+    if filename.endswith(preprocessing.GAME_RECORD_SUFFIX):
+        return pick_examples_from_game_record(filename, samples_per_game)
     protos = list(tf.python_io.tf_record_iterator(filename, READ_OPTS))
     if len(protos) < 20:  # Filter games with less than 20 moves
         return []
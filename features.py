@@ -139,6 +139,8 @@ DEFAULT_FEATURES = [
 
 DEFAULT_FEATURES_PLANES = sum(f.planes for f in DEFAULT_FEATURES)
 
+# These only use the board, board_deltas and to_play of a position, so they
+# can also be computed from a go.PositionSnapshot.
 NEW_FEATURES = [
     stone_features,
     color_to_play_feature
@@ -151,7 +153,110 @@ def extract_features(position, features=NEW_FEATURES):
     return np.concatenate([feature(position) for feature in features], axis=2)
 
 
+def game_board_deltas(moves, board=None):
+    '''Returns the [len(moves), N, N] int8 changes to the board made by each
+    move of a game played from board (empty by default), as in
+    go.Position.board_deltas.
+
+    The moves are assumed to be legal: no Position is created, and only
+    captures are resolved.
+    '''
+    board = np.zeros([go.N, go.N], dtype=np.int8) if board is None else np.copy(board)
+    deltas = np.zeros([len(moves), go.N, go.N], dtype=np.int8)
+    for t, (color, move) in enumerate(moves):
+        if move is None:
+            continue
+        board[move] = color
+        deltas[t][move] = color
+        for n in go.NEIGHBORS[move]:
+            if board[n] != -color:
+                continue
+            group, reached = go.find_reached(board, n)
+            if not any(board[r] == go.EMPTY for r in reached):
+                go.place_stones(board, go.EMPTY, group)
+                # The captured stones go from -color to empty.
+                go.place_stones(deltas[t], color, group)
+    return deltas
+
+
+def extract_game_features(moves, board=None, indices=None):
+    '''Computes extract_features(position) (with NEW_FEATURES) for the
+    position before each move of a game at once.
+
+    The boards are the cumulative sum of the moves' deltas, and the history
+    planes of each position are a sliding window over that sequence of
+    boards. This gives the same result as replaying the game from board
+    (empty by default) with go.Position, provided each move is played by the
+    player to move, as sgf_wrapper.replay_sgf arranges.
+
+    Args:
+        moves: the go.PlayerMoves of the game, e.g. position.recent.
+        indices: if given, only the positions before these moves are
+            featurized, and the game is only replayed up to the last of them.
+    Returns:
+        A [len(indices), N, N, NEW_FEATURES_PLANES] uint8 array, with
+        indices defaulting to all the moves.
+    '''
+    if board is None:
+        board = np.zeros([go.N, go.N], dtype=np.int8)
+    if indices is None:
+        indices = np.arange(len(moves))
+    indices = np.asarray(indices, dtype=np.int64)
+    num_positions = len(indices)
+    # Moves after the last position requested don't matter.
+    num_moves = int(np.max(indices)) + 1 if num_positions else 0
+    deltas = game_board_deltas(moves[:num_moves], board)
+    # boards[t] is the board before move t.
+    boards = np.empty([num_moves + 1, go.N, go.N], dtype=np.int8)
+    boards[0] = board
+    boards[1:] = board + np.cumsum(deltas, axis=0)
+
+    # The 8 most recent boards of position t are boards[t - i], and the oldest
+    # board is repeated when there are fewer, as in stone_features.
+    history = np.maximum(indices[:, None] - np.arange(8)[None, :], 0)
+    last_eight = boards[history]  # [T, 8, N, N]
+    to_play = np.array([moves[t].color for t in indices], dtype=np.int8)
+    return _new_features_from_history(last_eight, to_play)
+
+
+def _new_features_from_history(last_eight, to_play):
+    '''Returns the [T, N, N, NEW_FEATURES_PLANES] features of T positions,
+    given their [T, 8, N, N] most recent boards and their [T] colors to
+    play.'''
+    num_positions = len(to_play)
+    to_play = to_play.reshape(num_positions, 1, 1, 1)
+    output = np.zeros([num_positions, go.N, go.N, NEW_FEATURES_PLANES],
+                      dtype=np.uint8)
+    output[..., 0:16:2] = np.moveaxis(last_eight == to_play, 1, 3)
+    output[..., 1:16:2] = np.moveaxis(last_eight == -to_play, 1, 3)
+    output[..., 16] = (to_play == go.BLACK).reshape(num_positions, 1, 1)
+    return output
+
+
+def _bulk_extract_new_features(positions):
+    '''NEW_FEATURES of positions (or go.PositionSnapshots), all at once.
+
+    The earlier boards of a position are its board minus the cumulative sums
+    of its board_deltas. Padding the deltas with zeros repeats the oldest
+    board, as in stone_features.
+    '''
+    num_positions = len(positions)
+    boards = np.empty([num_positions, go.N, go.N], dtype=np.int8)
+    deltas = np.zeros([num_positions, 7, go.N, go.N], dtype=np.int8)
+    to_play = np.empty([num_positions], dtype=np.int8)
+    for i, pos in enumerate(positions):
+        boards[i] = pos.board
+        deltas[i, :len(pos.board_deltas)] = pos.board_deltas[:7]
+        to_play[i] = pos.to_play
+    last_eight = np.empty([num_positions, 8, go.N, go.N], dtype=np.int8)
+    last_eight[:, 0] = boards
+    last_eight[:, 1:] = boards[:, None] - np.cumsum(deltas, axis=1)
+    return _new_features_from_history(last_eight, to_play)
+
+
 def bulk_extract_features(positions, features=NEW_FEATURES):
+    if features == NEW_FEATURES:
+        return _bulk_extract_new_features(positions)
     num_positions = len(positions)
     num_planes = sum(f.planes for f in features)
     output = np.zeros([num_positions, go.N, go.N, num_planes], dtype=np.uint8)
@@ -53,6 +53,11 @@ holdout_dir = _with_base('data', 'holdout')
 sgf_dir = _with_base('sgf')
 training_chunk_dir = _with_base('data', 'training_chunks')
 golden_chunk_dir = _with_base('data', 'golden_chunks')
+config_dir = _with_base('config')
+
+
+def resign_threshold_path():
+    return os.path.join(config_dir(), 'resign_threshold')
 
 
 def get_models():
@@ -83,6 +88,23 @@ def get_model(model_num):
     return model_names_by_num[model_num]
 
 
+def get_resign_threshold():
+    """Returns the resign threshold published by set_resign_threshold, or None
+    if none has been published yet."""
+    path = resign_threshold_path()
+    if not gfile.Exists(path):
+        return None
+    with gfile.GFile(path) as f:
+        return float(f.read().strip())
+
+
+def set_resign_threshold(threshold):
+    "Publishes the resign threshold for selfplay workers to use."
+    gfile.MakeDirs(config_dir())
+    with gfile.GFile(resign_threshold_path(), 'w') as f:
+        f.write('{:.4f}\n'.format(threshold))
+
+
 def game_counts(n_back=20):
     """Prints statistics for the most recent n_back models"""
     for _, model_name in get_models[-n_back:]:
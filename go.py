@@ -20,6 +20,7 @@ A PlayerMove is a (Color, Move) tuple
 
 (0, 0) is considered to be the upper left corner of the board, and (18, 0) is the lower left.
 '''
+import collections
 from collections import namedtuple
 import copy
 import itertools
@@ -63,6 +64,14 @@ class PositionWithContext(namedtuple('SgfPosition', ['position', 'next_move', 'r
     pass
 
 
+class PositionSnapshot(namedtuple('PositionSnapshot', ['n', 'board', 'board_deltas', 'to_play'])):
+    '''The parts of a Position that features.NEW_FEATURES are computed from.
+
+    It shares its arrays with the Position, so the Position must not be
+    mutated by play_move(mutate=True) afterwards.'''
+    pass
+
+
 def place_stones(board, color, stones):
     for s in stones:
         board[s] = color
@@ -135,6 +144,79 @@ def is_eyeish(board, c):
         return color
 
 
+def find_pass_alive(board, color):
+    """Benson's algorithm for unconditional life.
+
+    Finds the chains of color that can't be captured even if color passes
+    every move, and the regions enclosed by them in which the opponent can't
+    live. A region (a connected set of points that aren't color) is "vital" to
+    a chain if all of its empty points are liberties of the chain. Chains with
+    fewer than two vital regions, and regions bordering such chains, are
+    removed until nothing changes.
+
+    Returns:
+        A boolean [N, N] array marking the pass-alive stones and the
+        points of the regions that are vital to them.
+    """
+    chains = []  # (stones, liberties)
+    regions = []  # (points, empty points, ids of the bordering chains)
+    chain_ids = {}
+    seen = set()
+    for c in ALL_COORDS:
+        if c in seen or board[c] != color:
+            continue
+        stones, reached = find_reached(board, c)
+        seen |= stones
+        for s in stones:
+            chain_ids[s] = len(chains)
+        chains.append((stones, {r for r in reached if board[r] == EMPTY}))
+    for c in ALL_COORDS:
+        if c in seen:
+            continue
+        points = set()
+        frontier = [c]
+        bordering = set()
+        while frontier:
+            current = frontier.pop()
+            if current in points:
+                continue
+            points.add(current)
+            for n in NEIGHBORS[current]:
+                if board[n] == color:
+                    bordering.add(chain_ids[n])
+                elif n not in points:
+                    frontier.append(n)
+        seen |= points
+        empties = {p for p in points if board[p] == EMPTY}
+        regions.append((points, empties, bordering))
+
+    alive = set(range(len(chains)))
+    healthy = set(range(len(regions)))
+    while True:
+        vital_counts = collections.Counter()
+        for r in healthy:
+            _, empties, bordering = regions[r]
+            for chain in bordering:
+                if empties <= chains[chain][1]:
+                    vital_counts[chain] += 1
+        still_alive = {chain for chain in alive if vital_counts[chain] >= 2}
+        if still_alive == alive:
+            break
+        alive = still_alive
+        healthy = {r for r in healthy if regions[r][2] <= alive}
+
+    result = np.zeros([N, N], dtype=np.bool_)
+    for chain in alive:
+        for s in chains[chain][0]:
+            result[s] = True
+    for r in healthy:
+        points, empties, bordering = regions[r]
+        if any(empties <= chains[chain][1] for chain in bordering):
+            for p in points:
+                result[p] = True
+    return result
+
+
 class Group(namedtuple('Group', ['id', 'stones', 'liberties', 'color'])):
     '''
     stones: a frozenset of Coordinates belonging to this group
@@ -314,6 +396,10 @@ class Position():
         self.to_play = to_play
         self.last_eight = None
 
+    def snapshot(self):
+        return PositionSnapshot(self.n, self.board, self.board_deltas,
+                                self.to_play)
+
     def __deepcopy__(self, memodict={}):
         new_board = np.copy(self.board)
         new_lib_tracker = copy.deepcopy(self.lib_tracker)
@@ -504,7 +590,26 @@ class Position():
 
     def score(self):
         'Return score from B perspective. If W is winning, score is negative.'
+        return self._area_score(np.copy(self.board))
+
+    def pass_alive(self):
+        """Returns an [N, N] array with BLACK or WHITE at the pass-alive stones
+        and the territory they enclose (see find_pass_alive), EMPTY elsewhere."""
+        result = np.zeros([N, N], dtype=np.int8)
+        result[find_pass_alive(self.board, BLACK)] = BLACK
+        result[find_pass_alive(self.board, WHITE)] = WHITE
+        return result
+
+    def estimated_score(self):
+        """Like score(), but stones inside pass-alive territory count as
+        dead, rather than alive as under Tromp-Taylor rules."""
         working_board = np.copy(self.board)
+        pass_alive = self.pass_alive()
+        settled = pass_alive != EMPTY
+        working_board[settled] = pass_alive[settled]
+        return self._area_score(working_board)
+
+    def _area_score(self, working_board):
         while EMPTY in working_board:
             unassigned_spaces = np.where(working_board == EMPTY)
             c = unassigned_spaces[0][0], unassigned_spaces[1][0]
@@ -17,6 +17,7 @@ import sys
 import itertools
 import json
 import time
+import numpy as np
 import sgf_wrapper
 import go
 import coords
@@ -26,6 +27,12 @@ def dbg(fmt, *args):
     print(fmt % args, file=sys.stderr, flush=True)
 
 
+def principal_variation(node):
+    "The most visited path below node, as a list of KGS coordinates."
+    return [coords.to_kgs(coords.from_flat(m.fmove))
+            for m in node.most_visited_path_nodes()]
+
+
 def translate_gtp_color(gtp_color):
     if gtp_color.lower() in ["b", "black"]:
         return go.BLACK
@@ -98,7 +105,13 @@ class BasicCmdHandler(object):
         return coords.to_kgs(move)
 
     def cmd_undo(self):
-        raise NotImplementedError()
+        if not self._player.undo():
+            raise ValueError("cannot undo")
+
+    def cmd_time_settings(self, main_time: int, byo_yomi_time: int,
+                          byo_yomi_stones: int):
+        self._player.time_manager.set_time_settings(
+            main_time, byo_yomi_time, byo_yomi_stones)
 
     def cmd_final_score(self):
         return self._player.get_result_string()
@@ -114,7 +127,24 @@ class KgsCmdHandler(object):
         self._player = player
 
     def cmd_time_left(self, color: str, time: int, stones: int):
-        pass
+        self._player.time_manager.set_time_left(
+            translate_gtp_color(color), time, stones)
+
+    def cmd_kgs_time_settings(self, system: str, main_time=0, period_time=0,
+                              periods=0):
+        manager = self._player.time_manager
+        if system == "none":
+            manager.set_time_settings(0, 0, 0)
+        elif system == "absolute":
+            manager.set_time_settings(main_time, 0, 0)
+        elif system == "canadian":
+            manager.set_time_settings(main_time, period_time, periods)
+        elif system == "byoyomi":
+            # Japanese byo-yomi: budget as if only one period was left, i.e.
+            # one move per period_time.
+            manager.set_time_settings(main_time, period_time, 1)
+        else:
+            raise ValueError("unknown time system: {}".format(system))
 
     def cmd_showboard(self):
         print('\n\n' + str(self._player.get_position()) + '\n\n', file=sys.stderr)
@@ -154,15 +184,21 @@ class RegressionsCmdHandler(object):
         except:
             raise ValueError("Unreadable file: " + filename)
 
-        # This is kinda bad, because replay_sgf is already calling
-        # 'play move' on its internal position objects, but we really
-        # want to advance the engine along with us rather than try to
-        # push in some finished Position object.
-        for idx, p in enumerate(sgf_wrapper.replay_sgf(contents)):
-            print("playing #", idx, p.next_move, file=sys.stderr)
-            self._player.play_move(p.next_move)
+        # Replay the moves on bare positions rather than playing each move
+        # through the player, which would search (and describe) every move.
+        # The moves become a chain of unexpanded nodes, so they can be undone.
+        komi = self._player.get_position().komi
+        history = []
+        for idx, pwc in enumerate(sgf_wrapper.replay_sgf(contents)):
+            pwc.position.komi = komi
+            history.append(pwc.position)
             if movenum and idx == movenum:
                 break
+        if not history:
+            raise ValueError("No moves in file: " + filename)
+        position = pwc.position.play_move(pwc.next_move)
+        self._player.initialize_game(position, history)
+        print("loaded %d moves" % position.n, file=sys.stderr)
 
 
 class GoGuiCmdHandler(object):
@@ -210,6 +246,10 @@ class GoGuiCmdHandler(object):
 
 
 class MiniguiCmdHandler(BasicCmdHandler):
+    # Q values in the search status are sent as integers, in units of
+    # 1 / STATUS_Q_SCALE.
+    STATUS_Q_SCALE = 1000
+
     def __init__(self, player, courtesy_pass=False):
         super().__init__(player, courtesy_pass)
 
@@ -220,6 +260,11 @@ class MiniguiCmdHandler(BasicCmdHandler):
 
         self._last_report_time = None
         self._report_search_interval = 0.0
+        # The root, quantised child_Q and child_N of the last search status
+        # report, which the next report only sends the changes to.
+        self._reported_root = None
+        self._reported_q = None
+        self._reported_n = None
 
     def cmd_echo(self, *args):
         return " ".join(args)
@@ -306,14 +351,20 @@ class MiniguiCmdHandler(BasicCmdHandler):
     def _minigui_report_search_status(self, leaves):
         """Prints the current MCTS search status to stderr.
 
-        Reports the current search path, root node's child_Q, root node's
-        child_N, the most visited path in a format that can be parsed by
-        one of the STDERR_HANDLERS in minigui.ts.
+        Reports the current search path, the root node's Q, child_Q and
+        child_N, and the most visited path as a single mg-status JSON
+        message, parsed by statusHandler in minigui.ts.
+
+        Q values are quantised, and child_Q and child_N are sparse maps from
+        move index to value, holding only the entries that changed since the
+        last report. The first report of each root has "full" set, and only
+        holds the non-zero entries.
 
         Args:
           leaves: list of leaf MCTSNodes returned by tree_search().
          """
         root = self._player.get_root()
+        msg = {}
         if leaves:
             path = []
             leaf = leaves[0]
@@ -321,15 +372,100 @@ class MiniguiCmdHandler(BasicCmdHandler):
                 path.append(leaf.fmove)
                 leaf = leaf.parent
             path = [coords.to_kgs(coords.from_flat(m)) for m in reversed(path)]
-            dbg("mg-search:%s", " ".join(path))
+            msg["search"] = " ".join(path)
+
+        q = np.round(root.child_Q * self.STATUS_Q_SCALE).astype(np.int32)
+        n = root.child_N.astype(np.int32)
+        if root is not self._reported_root:
+            msg["full"] = 1
+            changed_q = np.flatnonzero(q)
+            changed_n = np.flatnonzero(n)
+        else:
+            changed_q = np.flatnonzero(q != self._reported_q)
+            changed_n = np.flatnonzero(n != self._reported_n)
+        self._reported_root, self._reported_q, self._reported_n = root, q, n
 
-        q = root.child_Q - root.Q
-        q = ['%.3f' % x for x in q]
-        dbg("mg-q:%s", " ".join(q))
+        msg["rootq"] = int(round(root.Q * self.STATUS_Q_SCALE))
+        msg["q"] = {str(i): int(q[i]) for i in changed_q}
+        msg["n"] = {str(i): int(n[i]) for i in changed_n}
+        msg["pv"] = " ".join(principal_variation(root))
+        dbg("mg-status:%s", json.dumps(msg, separators=(",", ":")))
 
-        n = ['%d' % x for x in root.child_N]
-        dbg("mg-n:%s", " ".join(n))
 
-        nodes = root.most_visited_path_nodes()
-        path = [coords.to_kgs(coords.from_flat(m.fmove)) for m in nodes]
-        dbg("mg-pv:%s", " ".join(path))
+class AnalysisCmdHandler(object):
+    """Streams the analysis of the current position, as Leela Zero's
+    lz-analyze and KataGo's kata-analyze do for analysis GUIs.
+
+    Both commands take an optional color (which must be the player to move)
+    and an optional interval in centiseconds, and search until the next
+    command arrives, printing an info line every interval. They need a
+    gtp_engine.AsyncEngine to be interrupted.
+    """
+
+    # Default interval between two info lines, in centiseconds.
+    DEFAULT_INTERVAL = 100
+
+    def __init__(self, player):
+        self._player = player
+
+    def cmd_lz_analyze(self, *args):
+        return self._analyze(args, self._lz_info)
+
+    def cmd_kata_analyze(self, *args):
+        return self._analyze(args, self._kata_info)
+
+    def _analyze(self, args, format_info):
+        # Parse the arguments before streaming starts, so that errors are
+        # reported as such.
+        args = list(args)
+        if args and args[0].lower() in ("b", "w", "black", "white"):
+            color = translate_gtp_color(args.pop(0))
+            if color != self._player.get_position().to_play:
+                raise ValueError("can only analyze for the player to move")
+        if args and args[0] == "interval":
+            args.pop(0)
+        interval = self.DEFAULT_INTERVAL
+        if args:
+            interval = int(args.pop(0))
+        # Other options, e.g. minmoves, are ignored.
+        return self._stream(max(1, interval) / 100.0, format_info)
+
+    def _stream(self, interval, format_info):
+        player = self._player
+        next_report = time.time() + interval
+        while not player.interrupted.is_set():
+            if player.get_root().is_done():
+                player.interrupted.wait(interval)
+            else:
+                player.tree_search()
+            if time.time() >= next_report:
+                yield " ".join(format_info(*c) for c in self._candidates())
+                next_report = time.time() + interval
+
+    def _candidates(self):
+        """Yields (order, move, visits, winrate, prior, pv) for each visited
+        child of the root, most visited first, with the winrate from the
+        perspective of the player to move."""
+        root = self._player.get_root()
+        order = np.argsort(-root.child_N, kind="stable")
+        for i, fmove in enumerate(order):
+            visits = int(root.child_N[fmove])
+            if visits == 0:
+                break
+            q = root.child_Q[fmove] * root.to_play
+            move = coords.to_kgs(coords.from_flat(fmove))
+            child = root.children.get(fmove)
+            pv = [move] + (principal_variation(child) if child else [])
+            yield (i, move, visits, (q + 1) / 2,
+                   root.original_prior[fmove], pv)
+
+    @staticmethod
+    def _lz_info(order, move, visits, winrate, prior, pv):
+        return "info move {} visits {} winrate {} prior {} order {} pv {}".format(
+            move, visits, int(winrate * 10000), int(prior * 10000), order,
+            " ".join(pv))
+
+    @staticmethod
+    def _kata_info(order, move, visits, winrate, prior, pv):
+        return "info move {} visits {} winrate {:.6f} prior {:.6f} order {} pv {}".format(
+            move, visits, winrate, prior, order, " ".join(pv))
@@ -15,9 +15,13 @@
 # Version of the GTP specification used:
 #   https://www.lysator.liu.se/~gunnar/gtp/gtp2-spec-draft2/gtp2-spec.html
 
+import asyncio
+import collections
+import concurrent.futures
 import inspect
 import re
 import sys
+import threading
 import traceback
 
 
@@ -70,6 +74,19 @@ def _print_msg(result, msg_id, msg):
     print("{}{}{}\n".format(result, msg_id, msg), flush=True)
 
 
+def _print_stream(msg_id, lines):
+    """Prints a successful response whose lines are produced while the command
+    runs, e.g. analysis updates. The response ends when lines is exhausted."""
+    print("={}".format(" {}".format(msg_id) if msg_id else ""), flush=True)
+    try:
+        for line in lines:
+            print(line, flush=True)
+    except Exception:
+        # It's too late to report an error to the client.
+        traceback.print_exc(file=sys.stderr)
+    print("", flush=True)
+
+
 def _print_error(msg_id, msg):
     _print_msg("?", msg_id, msg)
 
@@ -121,10 +138,14 @@ class Engine(object):
 
     The engine by itself doesn't do anything: clients must register command
     handler objects using `add_cmd_handler`.
+
+    If a ponderer (e.g. a strategies.MCTSPlayer) is given, it is told to
+    ponder between commands, and to stop before handling each command.
     """
 
-    def __init__(self):
+    def __init__(self, ponderer=None):
         self.cmds = {}
+        self._ponderer = ponderer
 
     def add_cmd_handler(self, handler_obj):
         """Registers a new command handler object.
@@ -146,12 +167,27 @@ class Engine(object):
                         file=sys.stderr)
                 self.cmds[cmd] = fn
 
+    def run(self, stream):
+        "Handles the commands read from stream until quit or end of input."
+        for msg in stream:
+            if not self.handle_msg(msg.strip()):
+                break
+
     def handle_msg(self, msg):
         msg_id, cmd, args = _parse(_preprocess(msg))
         if not cmd:
             # Ignore empty lines.
             return True
 
+        if self._ponderer is None:
+            return self._handle_cmd(msg_id, cmd, args)
+        self._ponderer.stop_pondering()
+        keep_going = self._handle_cmd(msg_id, cmd, args)
+        if keep_going:
+            self._ponderer.start_pondering()
+        return keep_going
+
+    def _handle_cmd(self, msg_id, cmd, args):
         if cmd == "quit":
             _print_success(msg_id, "")
             return False
@@ -164,7 +200,11 @@ class Engine(object):
         try:
             handler = self.cmds[sanitized_cmd]
             args = _convert_args(handler, args)
-            _print_success(msg_id, handler(*args))
+            result = handler(*args)
+            if inspect.isgenerator(result):
+                _print_stream(msg_id, result)
+            else:
+                _print_success(msg_id, result)
         except Exception as e:
             traceback.print_exc(file=sys.stderr)
             if cmd in _CANONICAL_ERRORS:
@@ -175,6 +215,117 @@ class Engine(object):
         return True
 
 
+class AsyncEngine(Engine):
+    """A GTP engine that keeps reading commands while it handles one.
+
+    Commands are still handled one at a time and in order, in a worker thread.
+    Commands that arrive meanwhile can interrupt the one being handled, by
+    setting player.interrupted (see strategies.MCTSPlayer):
+      - any command interrupts a streaming command such as lz-analyze, as in
+        Leela Zero;
+      - stop interrupts any command, e.g. genmove then plays the best move
+        found so far;
+      - quit interrupts any command and exits once it is done;
+      - the end of input interrupts a streaming command, which would never
+        finish otherwise, and exits once the queued commands are done.
+    A command that is already queued when the command it should interrupt
+    starts interrupts it straight away.
+    """
+
+    # Commands that run until the next command arrives.
+    STREAMING_CMDS = ("lz_analyze", "kata_analyze")
+
+    def __init__(self, player, ponderer=None):
+        super().__init__(ponderer=ponderer)
+        self._player = player
+        self._lock = threading.Lock()
+        # The sanitized name of the command being handled, if any.
+        self._current_cmd = None
+        # The sanitized names of the commands read but not handled yet (None
+        # for empty lines), in order.
+        self._pending_cmds = collections.deque()
+        # Whether the end of input has been read.
+        self._end_of_input = False
+
+    def run(self, stream):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._serve(loop, stream))
+        finally:
+            loop.close()
+
+    async def _serve(self, loop, stream):
+        commands = asyncio.Queue()
+
+        def read():
+            for msg in stream:
+                loop.call_soon_threadsafe(self._receive, msg, commands)
+            loop.call_soon_threadsafe(self._receive_end, commands)
+
+        # A daemon thread, so that a blocking read doesn't keep the process
+        # alive after quit.
+        threading.Thread(target=read, daemon=True).start()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as worker:
+            while True:
+                msg = await commands.get()
+                if msg is None:
+                    break
+                with self._lock:
+                    self._pending_cmds.popleft()
+                keep_going = await loop.run_in_executor(
+                    worker, self.handle_msg, msg)
+                if not keep_going:
+                    break
+
+    def _receive(self, msg, commands):
+        """Called on the event loop for each line read, as soon as it is read,
+        to interrupt the command being handled if necessary."""
+        msg = msg.strip()
+        _, cmd, _ = _parse(_preprocess(msg))
+        cmd = cmd.replace("-", "_") if cmd else None
+        with self._lock:
+            if self._interrupts(cmd, self._current_cmd):
+                self._player.interrupted.set()
+            self._pending_cmds.append(cmd)
+        commands.put_nowait(msg)
+
+    def _receive_end(self, commands):
+        "Called on the event loop once the end of input has been read."
+        with self._lock:
+            self._end_of_input = True
+            if self._current_cmd in self.STREAMING_CMDS:
+                self._player.interrupted.set()
+        commands.put_nowait(None)
+
+    def _interrupts(self, cmd, current_cmd):
+        "Whether cmd interrupts current_cmd (both sanitized, or None)."
+        if cmd is None or current_cmd is None:
+            return False
+        return cmd in ("stop", "quit") or current_cmd in self.STREAMING_CMDS
+
+    def _handle_cmd(self, msg_id, cmd, args):
+        with self._lock:
+            self._current_cmd = cmd.replace("-", "_")
+            # A command may have been read before this one started: keep the
+            # interrupt it would have raised.
+            if (any(self._interrupts(pending, self._current_cmd)
+                    for pending in self._pending_cmds) or
+                    (self._end_of_input and
+                     self._current_cmd in self.STREAMING_CMDS)):
+                self._player.interrupted.set()
+            else:
+                self._player.interrupted.clear()
+        try:
+            if cmd == "stop":
+                # Nothing to do: stop only interrupts the previous command.
+                _print_success(msg_id, "")
+                return True
+            return super()._handle_cmd(msg_id, cmd, args)
+        finally:
+            with self._lock:
+                self._current_cmd = None
+
+
 class EngineCmdHandler(object):
     """Command handlers for basic engine stuff."""
 
@@ -19,7 +19,8 @@ from dual_net import DualNetwork
 from strategies import MCTSPlayer, CGOSPlayer
 
 
-def make_gtp_instance(read_file, readouts_per_move=100, verbosity=1, cgos_mode=False, kgs_mode=False):
+def make_gtp_instance(read_file, readouts_per_move=100, verbosity=1, cgos_mode=False, kgs_mode=False,
+                      ponder=False, analyze=False):
     n = DualNetwork(read_file)
     if cgos_mode:
         player = CGOSPlayer(network=n, seconds_per_move=5, timed_match=True,
@@ -31,7 +32,11 @@ def make_gtp_instance(read_file, readouts_per_move=100, verbosity=1, cgos_mode=F
     name = "Minigo-" + os.path.basename(read_file)
     version = "0.2"
 
-    engine = gtp_engine.Engine()
+    ponderer = player if ponder else None
+    if analyze:
+        engine = gtp_engine.AsyncEngine(player, ponderer=ponderer)
+    else:
+        engine = gtp_engine.Engine(ponderer=ponderer)
     engine.add_cmd_handler(
         gtp_engine.EngineCmdHandler(engine, name, version))
 
@@ -40,5 +45,7 @@ def make_gtp_instance(read_file, readouts_per_move=100, verbosity=1, cgos_mode=F
     engine.add_cmd_handler(RegressionsCmdHandler(player))
     engine.add_cmd_handler(GoGuiCmdHandler(player))
     engine.add_cmd_handler(MiniguiCmdHandler(player, courtesy_pass=kgs_mode))
+    if analyze:
+        engine.add_cmd_handler(AnalysisCmdHandler(player))
 
     return engine
@@ -45,15 +45,17 @@ WINDOW_SIZE = 125000000
 def gtp(load_file: 'The path to the network model files'=None,
         cgos_mode: 'Whether to use CGOS time constraints'=False,
         kgs_mode: 'Whether to use KGS courtesy-pass'=False,
+        ponder: 'Whether to keep searching while the opponent thinks'=False,
+        analyze: 'Whether to read commands while searching, and support lz-analyze'=False,
         verbose=1):
     engine = make_gtp_instance(load_file,
                                verbosity=verbose,
                                cgos_mode=cgos_mode,
-                               kgs_mode=kgs_mode)
+                               kgs_mode=kgs_mode,
+                               ponder=ponder,
+                               analyze=analyze)
     print("GTP engine ready\n", file=sys.stderr, flush=True)
-    for msg in sys.stdin:
-        if not engine.handle_msg(msg.strip()):
-            break
+    engine.run(sys.stdin)
 
 
 def bootstrap(
@@ -136,7 +138,8 @@ def selfplay(
         holdout_dir: "Where to write the games"="data/holdout",
         output_sgf: "Where to write the sgfs"="sgf/",
         verbose: '>=2 will print debug info, >=3 will print boards' = 1,
-        holdout_pct: 'how many games to hold out for validation' = 0.05):
+        holdout_pct: 'how many games to hold out for validation' = 0.05,
+        game_records: 'write a compact game record instead of tf.Examples' = False):
     clean_sgf = os.path.join(output_sgf, 'clean')
     full_sgf = os.path.join(output_sgf, 'full')
     utils.ensure_dir_exists(clean_sgf)
@@ -157,13 +160,20 @@ def selfplay(
     with gfile.GFile(os.path.join(full_sgf, '{}.sgf'.format(output_name)), 'w') as f:
         f.write(player.to_sgf())
 
-    tf_examples = preprocessing.make_dataset_from_selfplay(game_data)
-
     # Hold out 5% of games for evaluation.
     if random.random() < holdout_pct:
         fname = os.path.join(holdout_dir, "{}.tfrecord.zz".format(output_name))
+        tf_examples = preprocessing.make_dataset_from_selfplay(game_data)
+    elif game_records:
+        # example_buffer synthesizes the examples it samples from the record,
+        # so the game isn't featurized here.
+        fname = os.path.join(output_dir, output_name +
+                             preprocessing.GAME_RECORD_SUFFIX)
+        tf_examples = [preprocessing.make_game_record(
+            *player.extract_game_record())]
     else:
         fname = os.path.join(output_dir, "{}.tfrecord.zz".format(output_name))
+        tf_examples = preprocessing.make_dataset_from_selfplay(game_data)
 
     preprocessing.write_tf_examples(fname, tf_examples)
 
@@ -20,6 +20,7 @@ AlphaGo (AG) paper.
 
 import collections
 import math
+import weakref
 
 from absl import flags
 import numpy as np
@@ -44,6 +45,81 @@ flags.register_validator('dirichlet_noise_weight', lambda x: 0 <= x < 1)
 
 FLAGS = flags.FLAGS
 
+# Number of children listed by describe.
+DESCRIBE_TOP_K = 15
+
+# The statistics of one child in a SearchStats record.
+CHILD_STATS_DTYPE = np.dtype([
+    ('move', np.int16), ('N', np.int32), ('action_score', np.float32),
+    ('Q', np.float32), ('U', np.float32), ('prior', np.float32),
+    ('original_prior', np.float32)])
+
+# What describe shows of a node, captured cheaply so that the text can be
+# rendered later (if ever) by describe_stats:
+#   Q, total_N: the node's Q and the sum of its children's N.
+#   children: CHILD_STATS_DTYPE records of the most visited children.
+#   pv_moves, pv_N: the moves and visits of the most visited path.
+#   pv_Q: the Q of the last node of the most visited path.
+#   pv_end: whether the path ended at a move that has no node.
+SearchStats = collections.namedtuple('SearchStats', [
+    'Q', 'total_N', 'children', 'pv_moves', 'pv_N', 'pv_Q', 'pv_end'])
+
+
+def _format_path(moves, visits, q, game_end):
+    output = ["%s (%d) ==> " % (coords.to_kgs(coords.from_flat(move)), n)
+              for move, n in zip(moves, visits)]
+    if game_end:
+        output.append("GAME END")
+    output.append("Q: {:.5f}\n".format(q))
+    return ''.join(output)
+
+
+def describe_stats(stats):
+    "Renders a SearchStats record as MCTSNode.describe does."
+    children = stats.children
+    soft_n = children['N'] / max(1, stats.total_N)
+    prior = children['prior'].astype(np.float64)
+    p_delta = soft_n - prior
+    p_rel = np.divide(p_delta, prior, out=np.zeros_like(
+        p_delta), where=prior != 0)
+    output = []
+    output.append("{q:.4f}\n".format(q=stats.Q))
+    output.append(_format_path(
+        stats.pv_moves, stats.pv_N, stats.pv_Q, stats.pv_end))
+    output.append(
+        "move : action    Q     U     P   P-Dir    N  soft-N  p-delta  p-rel")
+    for i, child in enumerate(children):
+        output.append("\n{!s:4} : {: .3f} {: .3f} {:.3f} {:.3f} {:.3f} {:5d} {:.4f} {: .5f} {: .2f}".format(
+            coords.to_kgs(coords.from_flat(int(child['move']))),
+            child['action_score'],
+            child['Q'],
+            child['U'],
+            child['prior'],
+            child['original_prior'],
+            int(child['N']),
+            soft_n[i],
+            p_delta[i],
+            p_rel[i]))
+    return ''.join(output)
+
+
+# Shared, read-only statistics for nodes that have not been expanded yet.
+# Writing to it raises, which catches any attempt to update an unexpanded node.
+_NO_STATS = np.zeros([go.N * go.N + 1], dtype=np.float32)
+_NO_STATS.flags.writeable = False
+
+# Scratch space for select_leaf's action scores, reused for every node so that
+# selection doesn't allocate. Like the rest of the tree, not thread-safe.
+_SCORE_BUFFER = np.zeros([go.N * go.N + 1], dtype=np.float32)
+
+
+def _child_to_play(child, parent_to_play):
+    """Returns child.to_play, given its parent's, without walking up the
+    tree when the child has no position (see MCTSNode.to_play)."""
+    if child._position is None:
+        return -parent_to_play
+    return child._position.to_play
+
 
 class DummyNode(object):
     """A fake node of a MCTS search tree.
@@ -57,6 +133,164 @@ class DummyNode(object):
         self.child_N = collections.defaultdict(float)
         self.child_W = collections.defaultdict(float)
 
+    def _update_child_score(self, fmove):
+        pass
+
+
+class PositionCache(object):
+    """Bounds how many expanded nodes of a search tree keep their go.Position.
+
+    Once an expanded node's position has been used to create its children,
+    the tree only really needs the move that led to it. When more than
+    max_size expanded nodes hold a position, the least recently used ones drop
+    it, and it is recomputed on demand by replaying moves from the nearest
+    ancestor that still has one.
+
+    The root of a tree (and whichever node is pinned, normally the current
+    root of the player) always keeps its position, so there is always an
+    ancestor to replay from. So does a node whose player to move is not the
+    opponent of its parent's (e.g. a root flipped for an out of turn move, or
+    a turn corrected by sgf_wrapper.replay_sgf), since replaying its move
+    would give the wrong player to move.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # id(node) -> weakref to node, least recently used first. Weak
+        # references so that we don't keep discarded subtrees alive.
+        self._nodes = collections.OrderedDict()
+        self._pinned = None
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def pin(self, node):
+        "Never evict node's position (until another node is pinned)."
+        self._nodes.pop(id(node), None)
+        self._pinned = node
+
+    def touch(self, node):
+        "Marks node's position as recently used, evicting others if needed."
+        if node is self._pinned:
+            return
+        key = id(node)
+        self._nodes.pop(key, None)
+        self._nodes[key] = weakref.ref(node)
+        while len(self._nodes) > self.max_size:
+            _, ref = self._nodes.popitem(last=False)
+            evicted = ref()
+            if (evicted is not None and evicted is not self._pinned and
+                    isinstance(evicted.parent, MCTSNode) and
+                    evicted._position is not None and
+                    evicted._position.to_play == -evicted.parent.to_play):
+                evicted._position = None
+
+
+class StatsPool(object):
+    """Preallocated storage for the per-child statistics of expanded nodes.
+
+    Rather than allocating its own child_N, child_W, prior, illegal move and
+    score cache arrays, a node using the pool takes one row of a block of
+    preallocated arrays, and its arrays are views of that row. Blocks of
+    block_rows rows are added as needed and never copied. The rows of
+    discarded subtrees are released, and reused by later moves and games.
+
+    Like the rest of the tree, not thread-safe.
+    """
+
+    # The arrays of each row, in order.
+    FIELDS = ('child_N', 'child_W', 'child_prior', 'original_prior',
+              'illegal_moves', 'cached_Q', 'cached_U_base')
+
+    def __init__(self, block_rows):
+        self.block_rows = block_rows
+        self._blocks = []
+        self._free = []
+
+    @property
+    def capacity(self):
+        return len(self._blocks) * self.block_rows
+
+    @property
+    def num_free(self):
+        return len(self._free)
+
+    def take(self):
+        """Returns (row, stats), with stats the zeroed
+        [len(FIELDS), N * N + 1] float32 view of the row."""
+        if not self._free:
+            start = self.capacity
+            self._blocks.append(np.zeros(
+                [len(self.FIELDS), self.block_rows, go.N * go.N + 1],
+                dtype=np.float32))
+            # Hand out the rows of the new block in order.
+            self._free.extend(reversed(range(start, self.capacity)))
+        row = self._free.pop()
+        block, offset = divmod(row, self.block_rows)
+        stats = self._blocks[block][:, offset]
+        stats.fill(0)
+        return row, stats
+
+    def release_subtree(self, node):
+        """Releases the rows of node and its descendants, which must no longer
+        be used."""
+        queue = [node]
+        while queue:
+            node = queue.pop()
+            queue.extend(node.children.values())
+            if node._stats_row is not None:
+                self._free.append(node._stats_row)
+                node._stats_row = None
+
+    def reset(self):
+        "Releases every row, e.g. for a new game."
+        self._free = list(reversed(range(self.capacity)))
+
+
+class TranspositionTable(object):
+    """Remembers the network's evaluations of recently seen positions.
+
+    The same position is often reached by different move orders, both within
+    a search tree and across the moves of a game. Positions are identified by
+    their stones, the player to move and the ko point. The network also sees
+    the last few board states, which differ between move orders, so a
+    transposed position gets the evaluation of whichever move order was
+    evaluated first.
+
+    Only evaluations are shared: each transposed node keeps its own N and W,
+    so backups are unchanged. When more than max_size evaluations are stored,
+    the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(position):
+        return position.board.tobytes(), position.to_play, position.ko
+
+    def get(self, key):
+        "Returns the stored (move_probabilities, value) for key, or None."
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, move_probabilities, value):
+        self._entries[key] = (move_probabilities, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
 
 class MCTSNode(object):
     """A node of a MCTS search tree.
@@ -65,36 +299,140 @@ class MCTSNode(object):
     so that a decision can be made about which move to explore next. Upon
     selecting a move, the children dictionary is updated with a new node.
 
-    position: A go.Position instance
+    Most nodes of a search are leaves that are never expanded, so a node only
+    allocates its child statistics when it is expanded (or when a child is
+    added to it directly), and a child node only plays its move to create its
+    position the first time the position is needed.
+
+    position: A go.Position instance, or None to compute it lazily from the
+            parent's position and fmove.
     fmove: A move (coordinate) that led to this position, a a flattened coord
             (raw number between 0-N^2, with None a pass)
     parent: A parent MCTSNode.
+    position_cache: An optional PositionCache, shared by the whole tree, that
+            bounds the number of expanded nodes keeping their positions.
+    stats_pool: An optional StatsPool, shared by the whole tree, that holds
+            the child statistics of the nodes.
     """
 
-    def __init__(self, position, fmove=None, parent=None):
+    def __init__(self, position, fmove=None, parent=None, position_cache=None,
+                 stats_pool=None):
         if parent is None:
             parent = DummyNode()
         self.parent = parent
         self.fmove = fmove  # move that led to this position, as flattened coords
-        self.position = position
+        self._position = position
+        self.position_cache = position_cache
+        self.stats_pool = stats_pool
+        # Our row of stats_pool, and the view of it, once we have stats.
+        self._stats_row = None
+        self._pooled_stats = None
         self.is_expanded = False
         self.losses_applied = 0  # number of virtual losses on this node
         # using child_() allows vectorized computation of action score.
-        self.illegal_moves = 1000 * (1 - self.position.all_legal_moves())
-        self.child_N = np.zeros([go.N * go.N + 1], dtype=np.float32)
-        self.child_W = np.zeros([go.N * go.N + 1], dtype=np.float32)
+        # Until the node is expanded these all point at _NO_STATS.
+        self.illegal_moves = _NO_STATS
+        self.child_N = _NO_STATS
+        self.child_W = _NO_STATS
         # save a copy of the original prior before it gets mutated by d-noise.
-        self.original_prior = np.zeros([go.N * go.N + 1], dtype=np.float32)
-        self.child_prior = np.zeros([go.N * go.N + 1], dtype=np.float32)
+        self.original_prior = _NO_STATS
+        self.child_prior = _NO_STATS
+        # Per-child terms of child_action_score that only change when that
+        # child's N or W (or the priors) change; see _update_child_score.
+        self._cached_Q = None
+        self._cached_U_base = None
+        # Outcome of the game, once a finished node has been scored.
+        self._terminal_value = None
+        # The [(node, to_play)] path that the last select_leaf took to reach
+        # this node, until its result is backed up; see _path.
+        self._selected_path = None
         self.children = {}  # map of flattened moves to resulting MCTSNode
 
     def __repr__(self):
         return "<MCTSNode move=%s, N=%s, to_play=%s>" % (
             self.position.recent[-1:], self.N, self.position.to_play)
 
+    @property
+    def position(self):
+        if self._position is None:
+            self._position = self._replay_position()
+            if self.is_expanded and self.position_cache is not None:
+                self.position_cache.touch(self)
+        return self._position
+
+    def _replay_position(self):
+        "Replays moves from the nearest ancestor that still has a position."
+        fmoves = []
+        node = self
+        while node._position is None:
+            fmoves.append(node.fmove)
+            node = node.parent
+        fmoves.reverse()
+        position = node._position.play_move(coords.from_flat(fmoves[0]))
+        for fmove in fmoves[1:]:
+            position.play_move(coords.from_flat(fmove), mutate=True)
+        return position
+
+    @property
+    def to_play(self):
+        # Only the root's position is ever mutated (see
+        # Position.flip_playerturn), so a node without a position is always
+        # the opposite color of its parent.
+        node = self
+        color = 1
+        while node._position is None:
+            node = node.parent
+            color = -color
+        return color * node._position.to_play
+
+    def _allocate_child_stats(self):
+        if self.stats_pool is None:
+            self.child_N = np.zeros([go.N * go.N + 1], dtype=np.float32)
+            self.child_W = np.zeros([go.N * go.N + 1], dtype=np.float32)
+        else:
+            self._stats_row, self._pooled_stats = self.stats_pool.take()
+            self.child_N, self.child_W = self._pooled_stats[:2]
+
+    def _reset_child_scores(self):
+        "Recomputes the cached per-child score terms of an expanded node."
+        if self._pooled_stats is None:
+            self._cached_Q = self.child_W / (1 + self.child_N)
+            self._cached_U_base = (
+                self.child_prior / (1 + self.child_N)).astype(np.float32)
+            return
+        visits = self.child_N + 1
+        np.divide(self.child_W, visits, out=self._cached_Q)
+        np.divide(self.child_prior, visits, out=self._cached_U_base)
+
+    def _update_child_score(self, fmove):
+        "Refreshes the cached score terms of the child at fmove."
+        if self.is_expanded:
+            n = 1 + self.child_N[fmove]
+            self._cached_Q[fmove] = self.child_W[fmove] / n
+            self._cached_U_base[fmove] = self.child_prior[fmove] / n
+
+    def _cached_action_score(self, to_play=None):
+        """Same as child_action_score, but computed from the cached terms.
+
+        to_play: self.to_play, if the caller already knows it.
+        Returns a shared scratch buffer, which is overwritten by the next call
+        on any node.
+        """
+        scores = np.multiply(
+            self._cached_U_base, FLAGS.c_puct * math.sqrt(1 + self.N),
+            out=_SCORE_BUFFER)
+        if to_play is None:
+            to_play = self.to_play
+        if to_play == go.BLACK:
+            scores += self._cached_Q
+        else:
+            scores -= self._cached_Q
+        scores -= self.illegal_moves
+        return scores
+
     @property
     def child_action_score(self):
-        return self.child_Q * self.position.to_play + self.child_U - self.illegal_moves
+        return self.child_Q * self.to_play + self.child_U - self.illegal_moves
 
     @property
     def child_Q(self):
@@ -116,6 +454,7 @@ class MCTSNode(object):
     @N.setter
     def N(self, value):
         self.parent.child_N[self.fmove] = value
+        self.parent._update_child_score(self.fmove)
 
     @property
     def W(self):
@@ -124,41 +463,96 @@ class MCTSNode(object):
     @W.setter
     def W(self, value):
         self.parent.child_W[self.fmove] = value
+        self.parent._update_child_score(self.fmove)
 
     @property
     def Q_perspective(self):
         "Return value of position, from perspective of player to play."
-        return self.Q * self.position.to_play
+        return self.Q * self.to_play
 
     def select_leaf(self):
         current = self
+        to_play = self.to_play
+        # Record the path, and whose turn it is at each node, for the virtual
+        # loss and backup of the leaf.
+        path = []
         pass_move = go.N * go.N
         while True:
-            current.N += 1
+            path.append((current, to_play))
+            current.parent.child_N[current.fmove] += 1
+            current.parent._update_child_score(current.fmove)
             # if a node has never been evaluated, we have no basis to select a child.
             if not current.is_expanded:
                 break
             # HACK: if last move was a pass, always investigate double-pass first
             # to avoid situations where we auto-lose by passing too early.
-            if (current.position.recent
-                and current.position.recent[-1].move is None
-                    and current.child_N[pass_move] == 0):
-                current = current.maybe_add_child(pass_move)
-                continue
-
-            best_move = np.argmax(current.child_action_score)
+            # Only look at the position if we don't know the move that led to
+            # it, since interior nodes may have had their positions evicted.
+            if (current.child_N[pass_move] == 0 and
+                (current.fmove == pass_move if current.fmove is not None else
+                 current.position.recent and
+                 current.position.recent[-1].move is None)):
+                best_move = pass_move
+            else:
+                best_move = np.argmax(current._cached_action_score(to_play))
             current = current.maybe_add_child(best_move)
+            to_play = _child_to_play(current, to_play)
+        current._selected_path = path
         return current
 
-    def maybe_add_child(self, fcoord):
-        """ Adds child node for fcoord if it doesn't already exist, and returns it. """
+    def maybe_add_child(self, fcoord, position=None):
+        """ Adds child node for fcoord if it doesn't already exist, and returns it.
+
+        position: the new child's position, if it is already known. By default
+            it is computed when it is first needed.
+        """
         if fcoord not in self.children:
-            new_position = self.position.play_move(
-                coords.from_flat(fcoord))
+            # The child's N and W live in our arrays, even if we're not
+            # expanded yet (e.g. a move played without searching first).
+            if self.child_N is _NO_STATS:
+                self._allocate_child_stats()
             self.children[fcoord] = MCTSNode(
-                new_position, fmove=fcoord, parent=self)
+                position, fmove=fcoord, parent=self,
+                position_cache=self.position_cache,
+                stats_pool=self.stats_pool)
         return self.children[fcoord]
 
+    # The methods below update the statistics that each node on the path from
+    # some ancestor down to this node keeps in its parent's arrays. The path
+    # starts at up_to, or at the root of the tree.
+
+    def _path(self, up_to):
+        """Returns the [(node, to_play)] path from up_to (or the root) down
+        to this node.
+
+        This is the path recorded by the select_leaf that returned this node,
+        extended upward if that search started below up_to. Only nodes
+        outside the recorded path are walked, and to_play is looked up once.
+        """
+        path = self._selected_path
+        if path is None:
+            path = []
+            top = self
+            ancestors = [self]
+        else:
+            for i, (node, _) in enumerate(path):
+                if node is up_to:
+                    return path[i:]
+            top = path[0][0]
+            ancestors = []
+        while top is not up_to and top.parent.parent is not None:
+            top = top.parent
+            ancestors.append(top)
+        if not ancestors:
+            return path
+        ancestors.reverse()
+        to_play = ancestors[0].to_play
+        prefix = [(ancestors[0], to_play)]
+        for node in ancestors[1:]:
+            to_play = _child_to_play(node, to_play)
+            prefix.append((node, to_play))
+        return prefix + path
+
     def add_virtual_loss(self, up_to):
         """Propagate a virtual loss up to the root node.
 
@@ -166,22 +560,18 @@ class MCTSNode(object):
             up_to: The node to propagate until. (Keep track of this! You'll
                 need it to reverse the virtual loss later.)
         """
-        self.losses_applied += 1
-        # This is a "win" for the current node; hence a loss for its parent node
-        # who will be deciding whether to investigate this node again.
-        loss = self.position.to_play
-        self.W += loss
-        if self.parent is None or self is up_to:
-            return
-        self.parent.add_virtual_loss(up_to)
+        for node, to_play in self._path(up_to):
+            node.losses_applied += 1
+            # This is a "win" for the current node; hence a loss for its parent
+            # node who will be deciding whether to investigate this node again.
+            node.parent.child_W[node.fmove] += to_play
+            node.parent._update_child_score(node.fmove)
 
     def revert_virtual_loss(self, up_to):
-        self.losses_applied -= 1
-        revert = -1 * self.position.to_play
-        self.W += revert
-        if self.parent is None or self is up_to:
-            return
-        self.parent.revert_virtual_loss(up_to)
+        for node, to_play in self._path(up_to):
+            node.losses_applied -= 1
+            node.parent.child_W[node.fmove] -= to_play
+            node.parent._update_child_score(node.fmove)
 
     def revert_visits(self, up_to):
         """Revert visit increments.
@@ -193,21 +583,33 @@ class MCTSNode(object):
         only count once for the repeatedly selected node, we also have to
         revert the incremented visit counts.
         """
-        self.N -= 1
-        if self.parent is None or self is up_to:
-            return
-        self.parent.revert_visits(up_to)
+        for node, _ in self._path(up_to):
+            node.parent.child_N[node.fmove] -= 1
+            node.parent._update_child_score(node.fmove)
+        self._selected_path = None
 
     def incorporate_results(self, move_probabilities, value, up_to):
+        if self._expand(move_probabilities, value):
+            self.backup_value(value, up_to=up_to)
+        else:
+            self.revert_visits(up_to=up_to)
+
+    def _expand(self, move_probabilities, value):
+        """Expands this node with the network's evaluation.
+
+        Returns:
+            False if the node had already been expanded, in which case the
+            evaluation is discarded.
+        """
         assert move_probabilities.shape == (go.N * go.N + 1,)
         # A finished game should not be going through this code path - should
         # directly call backup_value() on the result of the game.
         assert not self.position.is_game_over()
         if self.is_expanded:
-            self.revert_visits(up_to=up_to)
-            return
+            return False
         self.is_expanded = True
-        self.original_prior = self.child_prior = move_probabilities
+        if self.child_N is _NO_STATS:
+            self._allocate_child_stats()
         # initialize child Q as current node's value, to prevent dynamics where
         # if B is winning, then B will only ever explore 1 move, because the Q
         # estimation will be so much larger than the 0 of the other moves.
@@ -216,8 +618,22 @@ class MCTSNode(object):
         # continuing to explore the most favorable move. This is a waste of search.
         #
         # The value seeded here acts as a prior, and gets averaged into Q calculations.
-        self.child_W = np.ones([go.N * go.N + 1], dtype=np.float32) * value
-        self.backup_value(value, up_to=up_to)
+        if self._pooled_stats is None:
+            self.illegal_moves = 1000 * (1 - self.position.all_legal_moves())
+            self.original_prior = self.child_prior = move_probabilities
+            self.child_W = np.full([go.N * go.N + 1], value, dtype=np.float32)
+        else:
+            (_, _, self.child_prior, self.original_prior, self.illegal_moves,
+             self._cached_Q, self._cached_U_base) = self._pooled_stats
+            np.multiply(1 - self.position.all_legal_moves(), 1000,
+                        out=self.illegal_moves)
+            self.child_prior[:] = move_probabilities
+            self.original_prior[:] = move_probabilities
+            self.child_W.fill(value)
+        self._reset_child_scores()
+        if self.position_cache is not None:
+            self.position_cache.touch(self)
+        return True
 
     def backup_value(self, value, up_to):
         """Propagates a value estimation up to the root node.
@@ -226,22 +642,88 @@ class MCTSNode(object):
             value: the value to be propagated (1 = black wins, -1 = white wins)
             up_to: the node to propagate until.
         """
-        self.W += value
-        if self.parent is None or self is up_to:
-            return
-        self.parent.backup_value(value, up_to)
+        for node, _ in self._path(up_to):
+            node.parent.child_W[node.fmove] += value
+            node.parent._update_child_score(node.fmove)
+        self._selected_path = None
+
+    def tree_size(self):
+        "Returns the number of nodes in this subtree, including this node."
+        size = 0
+        queue = [self]
+        while queue:
+            node = queue.pop()
+            size += 1
+            queue.extend(node.children.values())
+        return size
+
+    def prune_subtrees(self, max_nodes):
+        """Collapses the least visited subtrees until at most max_nodes remain.
+
+        A collapsed child is just dropped from its parent's children: its N and
+        W stay in the parent's arrays, and if it is selected again it comes
+        back as an unexpanded leaf.
+
+        Args:
+            max_nodes: the number of nodes (including this one) to keep.
+        Returns:
+            The number of nodes removed.
+        """
+        nodes = []
+        queue = list(self.children.values())
+        while queue:
+            node = queue.pop()
+            nodes.append(node)
+            queue.extend(node.children.values())
+        excess = len(nodes) + 1 - max(max_nodes, 1)
+        if excess <= 0:
+            return 0
+        # A child is never visited more often than its parent, so the nodes
+        # with N <= threshold form whole subtrees hanging off nodes with
+        # N > threshold.
+        visits = np.array([node.N for node in nodes])
+        threshold = np.partition(visits, excess - 1)[excess - 1]
+        removed = 0
+        for node, n in zip(nodes, visits):
+            if n > threshold:
+                continue
+            removed += 1
+            if node.parent is self or node.parent.N > threshold:
+                del node.parent.children[node.fmove]
+                if self.stats_pool is not None:
+                    self.stats_pool.release_subtree(node)
+        return removed
 
     def is_done(self):
         '''True if the last two moves were Pass or if the position is at a move
         greater than the max depth.
         '''
+        if self._terminal_value is not None:
+            return True
         return self.position.is_game_over() or self.position.n >= FLAGS.max_game_length
 
+    @property
+    def terminal_value(self):
+        """The result of the finished game at this node (1 = black wins,
+        -1 = white wins).
+
+        Near the end of a game most readouts end at the same few finished
+        nodes, so the position is only scored the first time.
+        """
+        if self._terminal_value is None:
+            self._terminal_value = 1 if self.position.score() > 0 else -1
+        return self._terminal_value
+
     def inject_noise(self):
         dirch = np.random.dirichlet(
             [FLAGS.dirichlet_noise_alpha] * ((go.N * go.N) + 1))
-        self.child_prior = (self.child_prior * (1 - FLAGS.dirichlet_noise_weight) +
-                            dirch * FLAGS.dirichlet_noise_weight)
+        noisy_prior = (self.child_prior * (1 - FLAGS.dirichlet_noise_weight) +
+                       dirch * FLAGS.dirichlet_noise_weight)
+        if self._pooled_stats is None:
+            self.child_prior = noisy_prior
+        else:
+            self.child_prior[:] = noisy_prior
+        self._reset_child_scores()
 
     def children_as_pi(self, squash=False):
         """Returns the child visit counts as a probability distribution, pi
@@ -265,20 +747,25 @@ class MCTSNode(object):
             output.append(node)
         return output
 
-    def most_visited_path(self):
+    def _most_visited_path_stats(self):
+        "Returns (moves, visits, Q of the last node, game end) of the path."
         node = self
-        output = []
+        moves = []
+        visits = []
+        game_end = False
         while node.children:
             next_kid = np.argmax(node.child_N)
-            node = node.children.get(next_kid)
-            if node is None:
-                output.append("GAME END")
+            if next_kid not in node.children:
+                # Not expanded, or dropped by prune_subtrees or play_move.
+                game_end = True
                 break
-            output.append("%s (%d) ==> " % (coords.to_kgs(
-                                            coords.from_flat(node.fmove)),
-                                            node.N))
-        output.append("Q: {:.5f}\n".format(node.Q))
-        return ''.join(output)
+            node = node.children[next_kid]
+            moves.append(node.fmove)
+            visits.append(node.N)
+        return moves, visits, node.Q, game_end
+
+    def most_visited_path(self):
+        return _format_path(*self._most_visited_path_stats())
 
     def mvp_gg(self):
         """ Returns most visited path in go-gui VAR format e.g. 'b r3 w c17..."""
@@ -291,33 +778,59 @@ class MCTSNode(object):
                 coords.from_flat(node.fmove)))
         return ' '.join(output)
 
+    def search_stats(self, top_k=DESCRIBE_TOP_K):
+        """Captures the statistics that describe shows, as a SearchStats
+        record, for the top_k most visited children."""
+        action_score = self.child_action_score
+        # Most visited first, then by action score, then by move, as a stable
+        # sort on (N, action score) in reverse would.
+        order = np.lexsort((np.arange(go.N * go.N + 1), -action_score,
+                            -self.child_N))[:top_k]
+        order = order[self.child_N[order] > 0]
+        children = np.empty(len(order), dtype=CHILD_STATS_DTYPE)
+        children['move'] = order
+        children['N'] = self.child_N[order]
+        children['action_score'] = action_score[order]
+        children['Q'] = self.child_Q[order]
+        children['U'] = self.child_U[order]
+        children['prior'] = self.child_prior[order]
+        children['original_prior'] = self.original_prior[order]
+        moves, visits, pv_Q, pv_end = self._most_visited_path_stats()
+        return SearchStats(
+            Q=self.Q, total_N=float(np.sum(self.child_N)), children=children,
+            pv_moves=np.array(moves, dtype=np.int16),
+            pv_N=np.array(visits, dtype=np.int32), pv_Q=pv_Q, pv_end=pv_end)
+
     def describe(self):
-        sort_order = list(range(go.N * go.N + 1))
-        sort_order.sort(key=lambda i: (
-            self.child_N[i], self.child_action_score[i]), reverse=True)
-        soft_n = self.child_N / max(1, sum(self.child_N))
-        prior = self.child_prior
-        p_delta = soft_n - prior
-        p_rel = np.divide(p_delta, prior, out=np.zeros_like(
-            p_delta), where=prior != 0)
-        # Dump out some statistics
-        output = []
-        output.append("{q:.4f}\n".format(q=self.Q))
-        output.append(self.most_visited_path())
-        output.append(
-            "move : action    Q     U     P   P-Dir    N  soft-N  p-delta  p-rel")
-        for key in sort_order[:15]:
-            if self.child_N[key] == 0:
-                break
-            output.append("\n{!s:4} : {: .3f} {: .3f} {:.3f} {:.3f} {:.3f} {:5d} {:.4f} {: .5f} {: .2f}".format(
-                coords.to_kgs(coords.from_flat(key)),
-                self.child_action_score[key],
-                self.child_Q[key],
-                self.child_U[key],
-                self.child_prior[key],
-                self.original_prior[key],
-                int(self.child_N[key]),
-                soft_n[key],
-                p_delta[key],
-                p_rel[key]))
-        return ''.join(output)
+        return describe_stats(self.search_stats())
+
+
+def incorporate_batch(leaves, move_probabilities, values, up_to):
+    """Incorporates the network's evaluations of a batch of leaves.
+
+    Every leaf must have had a virtual loss applied (up to up_to) when it was
+    selected. This is equivalent to calling revert_virtual_loss and then
+    incorporate_results on each leaf in turn, but goes over each leaf's path
+    only once.
+
+    Args:
+        leaves: the MCTSNodes that were evaluated. The same node may appear
+            more than once, in which case only its first evaluation is used.
+        move_probabilities: the policy output for each leaf.
+        values: the value output for each leaf.
+        up_to: the node the virtual losses were propagated until.
+    """
+    for leaf, move_probs, value in zip(leaves, move_probabilities, values):
+        expanded = leaf._expand(move_probs, value)
+        for node, to_play in leaf._path(up_to):
+            node.losses_applied -= 1
+            parent = node.parent
+            if expanded:
+                parent.child_W[node.fmove] += value - to_play
+            else:
+                parent.child_W[node.fmove] -= to_play
+                parent.child_N[node.fmove] -= 1
+            parent._update_child_score(node.fmove)
+    # Duplicate leaves share a path, so only forget it once the batch is done.
+    for leaf in leaves:
+        leaf._selected_path = None
@@ -0,0 +1,126 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Gumbel root search ("Policy improvement by planning with Gumbel",
+Danihelka et al. 2022).
+
+Instead of choosing root moves by PUCT with Dirichlet noise, the root samples
+max_considered moves without replacement using the Gumbel-top-k trick, and
+spreads the readouts over them with sequential halving: after each round, the
+worse half of the candidates (by Gumbel noise + prior logit + a monotonic
+transform of Q) is dropped. Below the root, nodes are still selected by PUCT.
+
+Even with very few readouts, the move played is a policy improvement over the
+prior, and improved_policy is a better training target than visit counts.
+"""
+
+import math
+
+from absl import flags
+import numpy as np
+
+import go
+
+flags.DEFINE_integer('gumbel_max_considered', 16,
+                     'Number of root moves sampled for Gumbel sequential '
+                     'halving.')
+flags.register_validator('gumbel_max_considered', lambda x: x > 0)
+
+FLAGS = flags.FLAGS
+
+# Constants of the sigma transform of Q values, sigma(q) =
+# (C_VISIT + max_b N(b)) * C_SCALE * q. These are the values used for Go in
+# the paper.
+C_VISIT = 50
+C_SCALE = 0.1
+
+
+def prior_logits(root):
+    "Log prior of each move of root, without Dirichlet noise."
+    return np.log(np.maximum(root.original_prior, 1e-12))
+
+
+def transformed_q(root):
+    """sigma(q) of each child of root, with q rescaled to [0, 1] from the
+    perspective of the player to move.
+
+    Unvisited children have the Q of the root's network evaluation (see
+    MCTSNode._expand), which completes the Q values of unvisited moves.
+    """
+    q = (root.child_Q * root.to_play + 1) / 2
+    return (C_VISIT + np.max(root.child_N)) * C_SCALE * q
+
+
+def improved_policy(root):
+    "Returns softmax(logits + sigma(completed Q)) over the legal moves of root."
+    scores = prior_logits(root) + transformed_q(root)
+    scores[root.illegal_moves > 0] = -np.inf
+    scores -= np.max(scores)
+    probs = np.exp(scores)
+    return probs / np.sum(probs)
+
+
+class SequentialHalving(object):
+    """Schedules the root moves searched by one move's readouts.
+
+    root: an expanded MCTSNode.
+    num_readouts: the number of readouts the search will run.
+    max_considered: the number of moves to sample, default
+        --gumbel_max_considered.
+    """
+
+    def __init__(self, root, num_readouts, max_considered=None):
+        if max_considered is None:
+            max_considered = FLAGS.gumbel_max_considered
+        self.root = root
+        legal = root.illegal_moves == 0
+        gumbel = np.random.gumbel(size=go.N * go.N + 1)
+        self.base_scores = np.where(legal, gumbel + prior_logits(root), -np.inf)
+        num_considered = min(max_considered, np.count_nonzero(legal))
+        self.considered = np.argsort(
+            -self.base_scores, kind='stable')[:num_considered]
+        self.num_readouts = num_readouts
+        self.num_rounds = max(1, math.ceil(math.log2(num_considered)))
+        self.round = 0
+        self.round_visits = 0
+        self.round_budget = self._round_budget()
+
+    def _round_budget(self):
+        # Every candidate gets at least one visit per round, even if that
+        # means running over num_readouts.
+        num_considered = len(self.considered)
+        per_move = self.num_readouts // (num_considered * self.num_rounds)
+        return max(1, per_move) * num_considered
+
+    def scores(self):
+        return self.base_scores + transformed_q(self.root)
+
+    def next_move(self):
+        "Returns the root move that the next readout should search."
+        if (self.round_visits >= self.round_budget and
+                self.round < self.num_rounds - 1):
+            self.round += 1
+            self.round_visits = 0
+            keep = max(1, math.ceil(len(self.considered) / 2))
+            order = np.argsort(
+                -self.scores()[self.considered], kind='stable')
+            self.considered = self.considered[order[:keep]]
+            self.round_budget = self._round_budget()
+        self.round_visits += 1
+        # Visit the least visited candidate, so that each gets an equal share.
+        return self.considered[np.argmin(self.root.child_N[self.considered])]
+
+    def best_move(self):
+        "Returns the best of the remaining candidates."
+        return self.considered[np.argmax(self.scores()[self.considered])]
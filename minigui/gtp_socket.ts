@@ -76,12 +76,18 @@ class Socket {
     }
   }
 
+  // Asks the server to send search status messages at most once every
+  // intervalMs milliseconds. The server coalesces the ones in between.
+  setStatusInterval(intervalMs: number) {
+    this.sock.emit('status_interval', {interval_ms: intervalMs});
+  }
+
   newSession() {
     // Generates a new, unique session token and sends it to the server via
     // a special echo __NEW_TOKEN__ command. The server forwards this on to its
     // child Minigo process, which echos it back to the server after finishing
     // processing any other outstanding work. The server's stdout/stderr
-    // handling logic in std_bg_thread looks for the __NEW_TOKEN__ string,
+    // handling logic in Engine._forward looks for the __NEW_TOKEN__ string,
     // extracts the session token and then attaches that token to all subsequent
     // messages sent to the frontend.
     this.cmdQueue = [];
@@ -107,6 +107,7 @@ function init(boardSize: number) {
   gtp.send('clear_board');
   gtp.send('gamestate');
   gtp.send('report_search_interval 50');
+  gtp.setStatusInterval(100);
   gtp.send('info');
   gameState.gameOver = false;
   util.getElement('ui-container').classList.remove('hidden');
@@ -304,6 +305,7 @@ function resetGame(delay?: number) {
   gtp.send('clear_board', () => { gameState.gameOver = false; });
   gtp.send('gamestate');
   gtp.send('report_search_interval 50');
+  gtp.setStatusInterval(100);
   gtp.send('info');
 }
 
@@ -326,9 +328,12 @@ function principalVariationHandler(line: string) {
 }
 
 function qHandler(line: string) {
+  setQHeatMap(line.trim().split(' ').map(parseFloat));
+}
+
+function setQHeatMap(qs: number[]) {
   let heatMap = [];
-  for (let s of line.trim().split(' ')) {
-    let x = parseFloat(s);
+  for (let x of qs) {
     if (x > 0) {
       x = Math.sqrt(x);
     } else {
@@ -346,10 +351,13 @@ function qHandler(line: string) {
 }
 
 function nHandler(line: string) {
+  setNHeatMap(line.trim().split(' ').map((s) => parseInt(s)));
+}
+
+function setNHeatMap(visits: number[]) {
   let ns = new Array<number>();
   let nSum = 0;
-  for (let s of line.trim().split(' ')) {
-    let n = parseInt(s);
+  for (let n of visits) {
     nSum += n;
     ns.push(n);
   }
@@ -373,6 +381,50 @@ function nHandler(line: string) {
   }
 }
 
+// Q values in mg-status messages are integers, in units of 1 / STATUS_Q_SCALE.
+const STATUS_Q_SCALE = 1000;
+
+// A search status message: q and n map move indices to the child Q and N
+// values that changed since the previous message. A full message starts over
+// from all zeros.
+interface SearchStatus {
+  full?: number;
+  rootq: number;
+  q: {[index: string]: number};
+  n: {[index: string]: number};
+  search?: string;
+  pv: string;
+}
+
+// The root's child Q and N values, as of the last search status message.
+let statusQ = new Array<number>();
+let statusN = new Array<number>();
+
+function statusHandler(line: string) {
+  let obj = JSON.parse(line) as SearchStatus;
+  if (obj.full || statusQ.length != N * N + 1) {
+    statusQ = [];
+    statusN = [];
+    for (let i = 0; i < N * N + 1; ++i) {
+      statusQ.push(0);
+      statusN.push(0);
+    }
+  }
+  for (let i in obj.q) {
+    statusQ[parseInt(i)] = obj.q[i];
+  }
+  for (let i in obj.n) {
+    statusN[parseInt(i)] = obj.n[i];
+  }
+
+  if (obj.search !== undefined) {
+    searchHandler(obj.search);
+  }
+  principalVariationHandler(obj.pv);
+  setQHeatMap(statusQ.map((q) => (q - obj.rootq) / STATUS_Q_SCALE));
+  setNHeatMap(statusN);
+}
+
 interface GameState {
   session: string;
   board: string;
@@ -461,6 +513,7 @@ const STDERR_HANDLERS: Array<[string, gtpsock.StderrHandler]> = [
   ['mg-pv:', principalVariationHandler],
   ['mg-q:', qHandler],
   ['mg-n:', nHandler],
+  ['mg-status:', statusHandler],
   ['mg-gamestate:', gameStateHandler],
   ['', defaultStderrHandler],
 ];
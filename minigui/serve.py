@@ -4,7 +4,7 @@ sys.path.insert(0, ".")  # to run from minigo/ dir
 
 
 import argparse
-from flask import Flask
+from flask import Flask, request
 
 from flask_socketio import SocketIO
 
@@ -12,6 +12,7 @@ import functools
 import json
 import logging
 import subprocess
+import time
 from threading import Lock
 
 parser = argparse.ArgumentParser()
@@ -56,8 +57,50 @@ parser.add_argument(
     help="Which python interpreter to use for the engine. "
          "Defaults to `python` and only applies for the when --engine=py")
 
+parser.add_argument(
+    "--pool_size",
+    default=1,
+    type=int,
+    help="Number of idle engines kept running, so that new sessions don't "
+         "wait for an engine to start.")
+
+parser.add_argument(
+    "--max_engines",
+    default=4,
+    type=int,
+    help="Maximum number of engines, leased or idle, running at once.")
+
+parser.add_argument(
+    "--idle_timeout",
+    default=30 * 60,
+    type=float,
+    help="Seconds without commands after which a session's engine is "
+         "stopped. Its next command gets a fresh engine.")
+
+parser.add_argument(
+    "--health_check_interval",
+    default=5,
+    type=float,
+    help="Seconds between checks that engines are still running.")
+
+parser.add_argument(
+    "--status_interval",
+    default=100,
+    type=float,
+    help="Default milliseconds between two search status messages sent to "
+         "a client. Clients can ask for another rate.")
+
 args = parser.parse_args()
 
+# Clients can't ask for search status messages more often than this.
+MIN_STATUS_INTERVAL_MS = 20
+
+# Search status lines that are coalesced: between two sends to the client,
+# only the latest line with each of these prefixes is kept. The Python
+# engine's compact mg-status deltas are merged instead.
+COALESCED_PREFIXES = ("mg-search:", "mg-pv:", "mg-q:", "mg-n:")
+STATUS_PREFIX = "mg-status:"
+
 
 # Suppress Flask's info logging.
 log = logging.getLogger('werkzeug')
@@ -75,6 +118,7 @@ if args.engine == "py":
                    "main.py", "gtp",
                    "--load-file", args.model,
                    "--num_readouts", "1000",
+                   "--undo_depth", "8",
                    "-v", "2"]
 elif args.engine == "cc":
     GTP_COMMAND = [
@@ -98,48 +142,257 @@ def _open_pipes():
                             env=dict(os.environ, BOARD_SIZE=str(args.board_size)))
 
 
-token = ''
-echo_streams = True
-
-
-def std_bg_thread(stream):
-    global token
-    global echo_streams
-
-    for line in p.__getattribute__(stream):
-        line = line.decode()
-        if echo_streams:
-            sys.stdout.write(line)
-            if "GTP engine ready" in line:
-                echo_streams = False
-
-        if line[-1] == "\n":
-            line = line[:-1]
-
-        if line.startswith("= __NEW_TOKEN__ "):
-            token = line.split(" ", 3)[2]
-        else:
-            socketio.send(json.dumps({stream: line, "token": token}),
-                          namespace="/minigui", json=True)
-    print(stream, "bg_thread died")
+class Engine(object):
+    """An engine process, and the threads forwarding its output to the
+    socket session it is leased to."""
+
+    def __init__(self):
+        self.process = _open_pipes()
+        self.sid = None
+        self.token = ''
+        self.last_used = time.time()
+        self.echo_streams = True
+        # Search status waiting to be sent: prefix -> latest line, and the
+        # merged mg-status message.
+        self.status_lock = Lock()
+        self.pending_lines = {}
+        self.pending_status = None
+        self.last_status_time = 0
+        for stream in ("stderr", "stdout"):
+            socketio.start_background_task(
+                target=functools.partial(self._forward, stream))
+        socketio.start_background_task(target=self._flush_status_thread)
+
+    def _forward(self, stream):
+        for line in getattr(self.process, stream):
+            line = line.decode()
+            if self.echo_streams:
+                sys.stdout.write(line)
+                if "GTP engine ready" in line:
+                    self.echo_streams = False
+
+            if line[-1] == "\n":
+                line = line[:-1]
+
+            if line.startswith("= __NEW_TOKEN__ "):
+                self.token = line.split(" ", 3)[2]
+            elif self.sid is None:
+                continue
+            elif stream == "stderr" and self._add_status(line):
+                interval = self._status_interval()
+                if time.time() - self.last_status_time >= interval:
+                    self.flush_status()
+            else:
+                # Send the search status first, so that it isn't reordered
+                # with the lines that follow it, e.g. the move played.
+                self.flush_status()
+                self._send(stream, line)
+        print("engine", self.process.pid, stream, "closed")
+
+    def _flush_status_thread(self):
+        # Sends the status that no later line flushes, e.g. the last one of a
+        # search, at most an interval late.
+        while self.is_alive():
+            interval = self._status_interval()
+            socketio.sleep(interval)
+            if (self.sid is not None and
+                    time.time() - self.last_status_time >= interval):
+                self.flush_status()
+
+    def _status_interval(self):
+        "Seconds between two search status sends to the leasing session."
+        return status_intervals.get(self.sid, args.status_interval) / 1000
+
+    def _send(self, stream, line):
+        socketio.send(json.dumps({stream: line, "token": self.token}),
+                      namespace="/minigui", json=True, room=self.sid)
+
+    def _add_status(self, line):
+        """Adds a search status line to the pending status. Returns False if
+        line isn't a search status line."""
+        with self.status_lock:
+            if line.startswith(STATUS_PREFIX):
+                status = json.loads(line[len(STATUS_PREFIX):])
+                pending = self.pending_status
+                if pending is None or status.get("full"):
+                    self.pending_status = status
+                else:
+                    pending["q"].update(status["q"])
+                    pending["n"].update(status["n"])
+                    for key, value in status.items():
+                        if key not in ("q", "n"):
+                            pending[key] = value
+                return True
+            for prefix in COALESCED_PREFIXES:
+                if line.startswith(prefix):
+                    self.pending_lines[prefix] = line
+                    return True
+        return False
+
+    def flush_status(self):
+        with self.status_lock:
+            lines = list(self.pending_lines.values())
+            if self.pending_status is not None:
+                lines.append(STATUS_PREFIX + json.dumps(
+                    self.pending_status, separators=(",", ":")))
+            self.pending_lines = {}
+            self.pending_status = None
+            if lines:
+                self.last_status_time = time.time()
+            # Send while holding the lock, so that the forwarding and flushing
+            # threads can't reorder status messages.
+            for line in lines:
+                self._send("stderr", line)
+
+    def send(self, cmd):
+        self.last_used = time.time()
+        self.process.stdin.write(bytes(cmd + "\r\n", encoding="utf-8"))
+        self.process.stdin.flush()
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        self.sid = None
+        if self.is_alive():
+            self.process.kill()
+
+
+class EnginePool(object):
+    """Leases one engine to each socket session.
+
+    Up to --pool_size idle engines are kept running so that sessions start
+    without waiting for a model to load. Dead engines are replaced, and the
+    engines of sessions idle for longer than --idle_timeout are stopped.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.idle = []
+        self.leased = {}  # sid -> Engine
+        self._refill()
+
+    def _num_engines(self):
+        return len(self.idle) + len(self.leased)
+
+    def _refill(self):
+        # Called with self.lock held, or before other threads start.
+        self.idle = [e for e in self.idle if e.is_alive()]
+        while (len(self.idle) < args.pool_size and
+               self._num_engines() < args.max_engines):
+            self.idle.append(Engine())
+
+    def lease(self, sid):
+        """Returns the engine of session sid, leasing one if it has none.
+
+        Returns None if all engines are in use.
+        """
+        with self.lock:
+            engine = self.leased.get(sid)
+            if engine is None:
+                if self.idle:
+                    engine = self.idle.pop()
+                elif self._num_engines() < args.max_engines:
+                    engine = Engine()
+                else:
+                    return None
+                engine.sid = sid
+                engine.last_used = time.time()
+                self.leased[sid] = engine
+                self._refill()
+            return engine
+
+    def release(self, sid):
+        """Stops the engine of session sid. Engines are not reused, since they
+        hold the state of the session's game."""
+        with self.lock:
+            engine = self.leased.pop(sid, None)
+            if engine is not None:
+                engine.stop()
+            self._refill()
+
+    def restart(self, sid):
+        """Replaces the engine of session sid, e.g. after it crashed."""
+        with self.lock:
+            engine = self.leased.pop(sid, None)
+            if engine is not None:
+                engine.stop()
+        engine = self.lease(sid)
+        if engine is not None:
+            # Keep the session's token, so that the client doesn't ignore the
+            # new engine's output.
+            engine.token = tokens.get(sid, '')
+            _notify(sid, "Engine restarted: the game was lost.")
+        return engine
+
+    def check(self):
+        """Replaces dead engines and stops the engines of idle sessions."""
+        now = time.time()
+        with self.lock:
+            dead = [sid for sid, e in self.leased.items() if not e.is_alive()]
+            idle = [sid for sid, e in self.leased.items()
+                    if e.is_alive() and now - e.last_used > args.idle_timeout]
+        for sid in dead:
+            print("engine of session", sid, "died")
+            self.restart(sid)
+        for sid in idle:
+            print("stopping the engine of idle session", sid)
+            self.release(sid)
+        with self.lock:
+            self._refill()
+
+
+# sid -> the latest game token of the session, see gtp_socket.ts.
+tokens = {}
+
+# sid -> the milliseconds between search status messages the session asked
+# for.
+status_intervals = {}
+
+
+def _notify(sid, msg):
+    socketio.send(json.dumps({"stderr": msg, "token": tokens.get(sid, '')}),
+                  namespace="/minigui", json=True, room=sid)
+
+
+def health_check_thread():
+    while True:
+        socketio.sleep(args.health_check_interval)
+        pool.check()
 
 
 @socketio.on("gtpcmd", namespace="/minigui")
 def stdin_cmd(message):
-    print("C -> E:", message)
-    global p
+    print("C -> E:", request.sid, message)
+    if message["data"].startswith("echo __NEW_TOKEN__ "):
+        tokens[request.sid] = message["data"].split(" ", 2)[2]
+    engine = pool.lease(request.sid)
+    if engine is None:
+        _notify(request.sid, "All engines are busy, try again later.")
+        return
     try:
-        p.stdin.write(bytes(message["data"] + "\r\n", encoding="utf-8"))
-        p.stdin.flush()
+        engine.send(message["data"])
     except BrokenPipeError:
-        p = _open_pipes()
+        engine = pool.restart(request.sid)
+        if engine is not None:
+            engine.send(message["data"])
+
+
+@socketio.on("status_interval", namespace="/minigui")
+def set_status_interval(message):
+    status_intervals[request.sid] = max(
+        MIN_STATUS_INTERVAL_MS, float(message["interval_ms"]))
+
+
+@socketio.on("disconnect", namespace="/minigui")
+def disconnect():
+    pool.release(request.sid)
+    tokens.pop(request.sid, None)
+    status_intervals.pop(request.sid, None)
 
 
-p = _open_pipes()
-stderr_thread = socketio.start_background_task(
-    target=functools.partial(std_bg_thread, "stderr"))
-stdout_thread = socketio.start_background_task(
-    target=functools.partial(std_bg_thread, "stdout"))
+pool = EnginePool()
+health_thread = socketio.start_background_task(target=health_check_thread)
 
 
 @app.route("/")
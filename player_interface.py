@@ -39,12 +39,14 @@ class PlayerInterface(ABC):
         pass
 
     @abstractmethod
-    def initialize_game(self, position=None):
+    def initialize_game(self, position=None, history=()):
         """Initializes a new game.
 
         Args:
           position: the board position to copy for the initial game state. If
                     None, an empty board state is used for the initial position.
+          history: the positions that led to position, oldest first, whose
+                   moves can be undone.
         """
         pass
 
@@ -73,6 +75,16 @@ class PlayerInterface(ABC):
         """
         pass
 
+    @abstractmethod
+    def undo(self):
+        """Take back the last move played.
+
+        Returns:
+          True if a move was taken back.
+          False if there is no move to take back.
+        """
+        pass
+
     @abstractmethod
     def should_resign(self):
         """Should the current player resign?
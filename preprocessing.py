@@ -13,6 +13,7 @@
 # limitations under the License.
 
 '''Utilities to create, read, write tf.Examples.'''
+import collections
 import functools
 import random
 
@@ -34,6 +35,20 @@ TF_RECORD_CONFIG = tf.python_io.TFRecordOptions(
 # training, but smaller numbers can be used for aggregation or validation.
 SHUFFLE_BUFFER_SIZE = 2000000
 
+# Files of game records (see make_game_record) rather than tf.Examples.
+GAME_RECORD_SUFFIX = '.gamerecord.zz'
+
+# Game records store each pi as uint16 values, relative to its largest value.
+PI_QUANTIZATION = 2 ** 16 - 1
+
+# A parsed game record. moves are flat coords, played alternately from an
+# empty board with black first; example_moves are the move numbers of the
+# training examples, whose pis are pi_indices and pi_values split into
+# pi_lengths entries each.
+GameRecord = collections.namedtuple('GameRecord', [
+    'moves', 'example_moves', 'pi_indices', 'pi_values', 'pi_lengths',
+    'result', 'komi'])
+
 
 def _one_hot(index):
     onehot = np.zeros([go.N * go.N + 1], dtype=np.float32)
@@ -60,6 +75,113 @@ def make_tf_example(features, pi, value):
                 value=[value]))}))
 
 
+def _int64_feature(values):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=values))
+
+
+def quantize_pi(pi):
+    '''Returns the nonzero entries of pi as (indices, uint16 values), with the
+    largest value PI_QUANTIZATION.'''
+    quantized = np.round(pi / np.max(pi) * PI_QUANTIZATION).astype(np.uint16)
+    indices = np.flatnonzero(quantized)
+    return indices, quantized[indices]
+
+
+def dequantize_pi(indices, values):
+    pi = np.zeros([go.N * go.N + 1], dtype=np.float32)
+    pi[indices] = values
+    return pi / np.sum(pi)
+
+
+def make_game_record(moves, training_pis, result, komi):
+    '''Makes a tf.Example holding a whole selfplay game, from which
+    make_examples_from_game_record synthesizes the training examples.
+
+    A game takes a few bytes per move rather than the features and pi of each
+    position.
+
+    Args:
+        moves: the go.PlayerMoves of the game, played from an empty board.
+        training_pis: (move number, pi) for each training example.
+        result: the winner, 1 or -1.
+        komi: float
+    '''
+    assert all(color == (go.BLACK if i % 2 == 0 else go.WHITE)
+               for i, (color, _) in enumerate(moves))
+    example_moves = [i for i, _ in training_pis]
+    quantized = [quantize_pi(pi) for _, pi in training_pis]
+    pi_indices = np.concatenate(
+        [indices for indices, _ in quantized] + [np.zeros([0], np.int64)])
+    pi_values = np.concatenate(
+        [values for _, values in quantized] + [np.zeros([0], np.uint16)])
+    return tf.train.Example(features=tf.train.Features(feature={
+        'moves': _int64_feature([coords.to_flat(move) for _, move in moves]),
+        'example_moves': _int64_feature(example_moves),
+        'pi_indices': _int64_feature(pi_indices),
+        'pi_values': tf.train.Feature(
+            bytes_list=tf.train.BytesList(value=[pi_values.tostring()])),
+        'pi_lengths': _int64_feature(
+            [len(indices) for indices, _ in quantized]),
+        'outcome': tf.train.Feature(
+            float_list=tf.train.FloatList(value=[result])),
+        'komi': tf.train.Feature(
+            float_list=tf.train.FloatList(value=[komi]))}))
+
+
+def parse_game_record(protostring):
+    'Parses a serialized make_game_record tf.Example into a GameRecord.'
+    example = tf.train.Example()
+    example.ParseFromString(protostring)
+    feature = example.features.feature
+    return GameRecord(
+        moves=np.array(feature['moves'].int64_list.value, dtype=np.int64),
+        example_moves=np.array(
+            feature['example_moves'].int64_list.value, dtype=np.int64),
+        pi_indices=np.array(
+            feature['pi_indices'].int64_list.value, dtype=np.int64),
+        pi_values=np.frombuffer(
+            feature['pi_values'].bytes_list.value[0], dtype=np.uint16),
+        pi_lengths=np.array(
+            feature['pi_lengths'].int64_list.value, dtype=np.int64),
+        result=feature['outcome'].float_list.value[0],
+        komi=feature['komi'].float_list.value[0])
+
+
+def make_examples_from_game_record(record, examples=None):
+    '''Synthesizes the tf.Examples of a GameRecord.
+
+    Args:
+        record: a GameRecord.
+        examples: indices into record.example_moves of the examples to make.
+            Defaults to all of them. Only these positions are featurized.
+    Returns:
+        A list of tf.Example, in the order of examples.
+    '''
+    if examples is None:
+        examples = range(len(record.example_moves))
+    examples = list(examples)
+    moves = [go.PlayerMove(go.BLACK if i % 2 == 0 else go.WHITE,
+                           coords.from_flat(flat))
+             for i, flat in enumerate(record.moves)]
+    x = features_lib.extract_game_features(
+        moves, indices=record.example_moves[examples])
+    pi_ends = np.cumsum(record.pi_lengths)
+    pi_starts = pi_ends - record.pi_lengths
+    tf_examples = []
+    for features, i in zip(x, examples):
+        pi_slice = slice(pi_starts[i], pi_ends[i])
+        pi = dequantize_pi(record.pi_indices[pi_slice],
+                           record.pi_values[pi_slice])
+        tf_examples.append(make_tf_example(features, pi, record.result))
+    return tf_examples
+
+
+def read_game_records(filename):
+    'Returns the GameRecords in a GAME_RECORD_SUFFIX file.'
+    return [parse_game_record(protostring) for protostring in
+            tf.python_io.tf_record_iterator(filename, TF_RECORD_CONFIG)]
+
+
 def write_tf_examples(filename, tf_examples, serialize=True):
     '''
     Args:
@@ -195,16 +317,34 @@ def make_dataset_from_selfplay(data_extracts):
     '''
     Returns an iterable of tf.Examples.
     Args:
-        data_extracts: An iterable of (position, pi, result) tuples
+        data_extracts: An iterable of (position, pi, result) tuples, where
+            position may be a go.PositionSnapshot (see
+            MCTSPlayer.extract_data).
     '''
-    tf_examples = (make_tf_example(features_lib.extract_features(pos), pi, result)
-                   for pos, pi, result in data_extracts)
+    data_extracts = list(data_extracts)
+    # Featurize the whole game in one batch.
+    game_features = features_lib.bulk_extract_features(
+        [pos for pos, _, _ in data_extracts])
+    tf_examples = (make_tf_example(features, pi, result)
+                   for features, (_, pi, result) in zip(game_features,
+                                                        data_extracts))
     return tf_examples
 
 
 def make_dataset_from_sgf(sgf_filename, tf_record):
-    pwcs = sgf_wrapper.replay_sgf_file(sgf_filename)
-    tf_examples = map(_make_tf_example_from_pwc, pwcs)
+    with open(sgf_filename) as f:
+        sgf_contents = f.read()
+    try:
+        board, moves, result = sgf_wrapper.read_sgf_moves(sgf_contents)
+    except ValueError:
+        # A move in the root node, or setup stones in the middle of the game.
+        pwcs = sgf_wrapper.replay_sgf(sgf_contents)
+        tf_examples = map(_make_tf_example_from_pwc, pwcs)
+    else:
+        game_features = features_lib.extract_game_features(moves, board)
+        tf_examples = (
+            make_tf_example(features, _one_hot(coords.to_flat(move)), result)
+            for features, (_, move) in zip(game_features, moves))
     write_tf_examples(tf_record, tf_examples)
 
 
@@ -0,0 +1,107 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Calibrates the resign threshold from games played with resign disabled.
+
+selfplay_mcts disables resignation in a small fraction of games. Those games
+are played to the end, so their SGF comments (the root Q after each search)
+show how low the eventual winner's Q dropped along the way. Any threshold
+above that low point would have made the winner resign a won game.
+
+The calibrated threshold is the highest one that would have caused a false
+resignation in at most a target fraction of those games.
+"""
+
+import math
+import re
+
+import adjudication
+
+RESIGN_THRESHOLD_RE = re.compile(r"Resign Threshold: (-?\d\.\d*)")
+Q_RE = re.compile(r"C\[(-?\d\.\d*)")
+
+# Games with this resign threshold were played with resign disabled.
+RESIGN_DISABLED = -1.0
+
+# Never resign at a Q above this, however clean the games look.
+MAX_THRESHOLD = -0.5
+
+# Don't calibrate on fewer resign-disabled games than this.
+MIN_GAMES = 50
+
+# The resign threshold is in the first move's comment, within this many
+# characters of the start of a full selfplay SGF.
+HEADER_LENGTH = 1024
+
+
+def is_resign_disabled(header):
+    """Whether the start of a full selfplay SGF (its first HEADER_LENGTH
+    characters) says the game was played with resign disabled."""
+    threshold = RESIGN_THRESHOLD_RE.search(header)
+    return (threshold is not None and
+            float(threshold.group(1)) == RESIGN_DISABLED)
+
+
+def parse_sgf(contents):
+    """Extracts what calibration needs from a full (commented) selfplay SGF.
+
+    Returns:
+        (resign_threshold, winner, qs), with winner 1 for black and -1 for
+        white and qs the root Q values (from black's perspective) in the
+        comments, or None if the game has no result or no Q values.
+    """
+    result = adjudication.RESULT_RE.search(contents)
+    threshold = RESIGN_THRESHOLD_RE.search(contents)
+    qs = [float(q) for q in Q_RE.findall(contents)]
+    if not result or not threshold or not qs:
+        return None
+    winner = 1 if result.group(1).upper() == 'B' else -1
+    return float(threshold.group(1)), winner, qs
+
+
+def worst_winner_q(winner, qs):
+    "The lowest Q that the eventual winner saw, from its own perspective."
+    return min(q * winner for q in qs)
+
+
+def calibrate(worst_qs, target_rate, min_games=MIN_GAMES):
+    """Returns the highest resign threshold with a false resignation rate of
+    at most target_rate, or None if there are fewer than min_games games.
+
+    Args:
+        worst_qs: worst_winner_q of each resign-disabled game.
+        target_rate: the acceptable fraction of false resignations.
+    """
+    if len(worst_qs) < min_games:
+        return None
+    worst_qs = sorted(worst_qs)
+    # A game resigns falsely if its worst Q is below the threshold, so at most
+    # num_false games have a worst Q below worst_qs[num_false].
+    num_false = int(math.floor(target_rate * len(worst_qs)))
+    if num_false >= len(worst_qs):
+        return MAX_THRESHOLD
+    return min(max(worst_qs[num_false], RESIGN_DISABLED), MAX_THRESHOLD)
+
+
+def calibrate_from_sgfs(sgf_contents, target_rate, min_games=MIN_GAMES):
+    "Runs calibrate on the resign-disabled games among sgf_contents."
+    worst_qs = []
+    for contents in sgf_contents:
+        game = parse_sgf(contents)
+        if game is None:
+            continue
+        threshold, winner, qs = game
+        if threshold == RESIGN_DISABLED:
+            worst_qs.append(worst_winner_q(winner, qs))
+    return calibrate(worst_qs, target_rate, min_games=min_games)
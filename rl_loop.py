@@ -16,6 +16,7 @@
 import argparse
 import logging
 import os
+import random
 import sys
 import time
 
@@ -23,9 +24,11 @@ from absl import flags
 import argh
 from tensorflow import gfile
 
+import adjudication
 import cloud_logging
 import fsdb
 import main
+import resign_calibration
 import shipname
 
 # How many games before the selfplay workers will stop trying to play more.
@@ -37,6 +40,12 @@ MIN_GAMES_PER_GENERATION = 500
 # What percent of games to holdout from training per generation
 HOLDOUT_PCT = 0.05
 
+# Acceptable fraction of games in which the eventual winner would resign.
+RESIGN_FALSE_POSITIVE_RATE = 0.05
+
+# Most SGFs to look at when calibrating the resign threshold.
+MAX_CALIBRATION_SGFS = 2000
+
 
 def bootstrap(working_dir):
     bootstrap_name = shipname.generate(0)
@@ -53,6 +62,11 @@ def selfplay(verbose=2):
         print("{} has enough games ({})".format(model_name, len(games)))
         time.sleep(10*60)
         sys.exit(1)
+    resign_threshold = fsdb.get_resign_threshold()
+    if (resign_threshold is not None and
+            not flags.FLAGS['resign_threshold'].present):
+        print("Using calibrated resign threshold {}".format(resign_threshold))
+        flags.FLAGS.resign_threshold = resign_threshold
     print("Playing a game with model {}".format(model_name))
     model_save_path = os.path.join(fsdb.models_dir(), model_name)
     game_output_dir = os.path.join(fsdb.selfplay_dir(), model_name)
@@ -68,6 +82,58 @@ def selfplay(verbose=2):
     )
 
 
+def _full_sgf_files(n_back):
+    "The commented selfplay SGFs of the last n_back models."
+    sgf_files = []
+    for _, model_name in fsdb.get_models()[-int(n_back):]:
+        sgf_files.extend(gfile.Glob(
+            os.path.join(fsdb.sgf_dir(), model_name, 'full', '*.sgf')))
+    return sgf_files
+
+
+def _read(path):
+    with gfile.GFile(path) as f:
+        return f.read()
+
+
+def _read_resign_disabled(sgf_files):
+    "Yields the contents of the SGFs of games played with resign disabled."
+    for path in sgf_files:
+        with gfile.GFile(path) as f:
+            # Only read the rest of the file if the game is one we want.
+            header = f.read(resign_calibration.HEADER_LENGTH)
+            if resign_calibration.is_resign_disabled(header):
+                yield header + f.read()
+
+
+def calibrate_resign(n_back=1, target_rate=RESIGN_FALSE_POSITIVE_RATE):
+    """Calibrates the resign threshold on the resign-disabled games of the
+    last n_back models, and publishes it for the next selfplay workers.
+
+    Looks at a random sample of at most MAX_CALIBRATION_SGFS of the games.
+    """
+    sgf_files = _full_sgf_files(n_back)
+    if len(sgf_files) > MAX_CALIBRATION_SGFS:
+        sgf_files = random.sample(sgf_files, MAX_CALIBRATION_SGFS)
+    threshold = resign_calibration.calibrate_from_sgfs(
+        _read_resign_disabled(sgf_files), float(target_rate))
+    if threshold is None:
+        print("Not enough resign-disabled games in {} sgfs".format(
+            len(sgf_files)))
+        return
+    print("Resign threshold for {:.1%} false resigns: {:.4f}".format(
+        float(target_rate), threshold))
+    fsdb.set_resign_threshold(threshold)
+
+
+def adjudication_accuracy(n_back=1):
+    """Reports how often the adjudications recorded in the holdout games of
+    the last n_back models match the games' real results."""
+    total, correct = adjudication.holdout_accuracy(
+        map(_read, _full_sgf_files(n_back)))
+    print("{} of {} adjudications correct".format(correct, total))
+
+
 def train(working_dir):
     model_num, model_name = fsdb.get_latest_model()
 
@@ -153,8 +219,9 @@ def backfill():
 
 parser = argparse.ArgumentParser()
 
-argh.add_commands(parser, [train, selfplay, backfill,
-                           bootstrap, fsdb.game_counts, validate])
+argh.add_commands(parser, [train, selfplay, backfill, calibrate_resign,
+                           adjudication_accuracy, bootstrap, fsdb.game_counts,
+                           validate])
 
 if __name__ == '__main__':
     cloud_logging.configure()
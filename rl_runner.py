@@ -27,15 +27,22 @@ BUCKET_NAME = os.environ['BUCKET_NAME']
 
 
 def loop(working_dir='estimator_working_dir'):
-    """Run train and validate as subprocesses."""
+    """Run train and validate as subprocesses.
+
+    The resign threshold is calibrated on the latest generation's games
+    alongside training, so that it doesn't hold up the new model.
+    """
     flags = [
         working_dir,
         '--bucket_name', BUCKET_NAME,
     ]
     while True:
         print("==================================")
+        calibrate = subprocess.Popen(['python', 'rl_loop.py', 'calibrate_resign',
+                                      '--bucket_name', BUCKET_NAME])
         with timer("Train"):
             train = subprocess.call(['python', 'rl_loop.py', 'train'] + flags)
+            calibrate.wait()
             if train != 0:
                 print("Skipping validation")
                 continue
@@ -17,9 +17,22 @@ import sys
 import time
 
 from absl import flags
+import adjudication
 import coords
 from gtp_wrapper import MCTSPlayer
 
+flags.DEFINE_float('fast_move_fraction', 0,
+                   'Fraction of selfplay moves that only get a fast search of '
+                   'fast_move_readouts readouts, without noise. These moves '
+                   'are played but not used as training examples.')
+flags.register_validator('fast_move_fraction', lambda x: 0 <= x < 1)
+
+flags.DEFINE_integer('fast_move_readouts', 100,
+                     'Number of readouts of a fast selfplay move.')
+flags.register_validator('fast_move_readouts', lambda x: x > 0)
+
+FLAGS = flags.FLAGS
+
 
 def play(network, verbosity=0):
     ''' Plays out a self-play match, returning
@@ -27,7 +40,7 @@ def play(network, verbosity=0):
     - the n x 362 tensor of floats representing the mcts search probabilities
     - the n-ary tensor of floats representing the original value-net estimate
     where n is the number of moves in the game'''
-    readouts = flags.FLAGS.num_readouts  # defined in strategies.py
+    full_readouts = FLAGS.num_readouts  # defined in strategies.py
     # Disable resign in 5% of games
     if random.random() < 0.05:
         resign_threshold = -1.0
@@ -40,6 +53,12 @@ def play(network, verbosity=0):
 
     player.initialize_game()
 
+    adjudicator = None
+    if FLAGS.adjudicate_moves:
+        adjudicator = adjudication.Adjudicator()
+        # Play some games out anyway, to measure adjudication accuracy.
+        holdout = random.random() < FLAGS.adjudicate_holdout_pct
+
     # Must run this once at the start, so that noise injection actually
     # affects the first move of the game.
     first_node = player.root.select_leaf()
@@ -48,11 +67,16 @@ def play(network, verbosity=0):
 
     while True:
         start = time.time()
-        player.root.inject_noise()
-        current_readouts = player.root.N
+        # Playout cap randomization: most of the moves only get a cheap
+        # search, and only the full searches are used for training.
+        full_search = random.random() >= FLAGS.fast_move_fraction
+        if full_search:
+            readouts = full_readouts
+            player.root.inject_noise()
+        else:
+            readouts = FLAGS.fast_move_readouts
         # we want to do "X additional readouts", rather than "up to X readouts".
-        while player.root.N < current_readouts + readouts:
-            player.tree_search()
+        searched = player.search(readouts)
 
         if (verbosity >= 3):
             print(player.root.position)
@@ -62,8 +86,17 @@ def play(network, verbosity=0):
             player.set_result(-1 * player.root.position.to_play,
                               was_resign=True)
             break
+        if adjudicator is not None:
+            winner = adjudicator.update(player.root.position, player.root.Q)
+            if winner and not holdout:
+                player.set_result(winner, was_resign=False,
+                                  was_adjudicated=True)
+                break
+            if winner and player.holdout_adjudication is None:
+                player.holdout_adjudication = (
+                    winner, player.root.position.n)
         move = player.pick_move()
-        player.play_move(move)
+        player.play_move(move, for_training=full_search)
         if player.root.is_done():
             player.set_result(player.root.position.result(), was_resign=False)
             break
@@ -72,7 +105,10 @@ def play(network, verbosity=0):
             print("Q: {:.5f}".format(player.root.Q))
             dur = time.time() - start
             print("%d: %d readouts, %.3f s/100. (%.2f sec)" % (
-                player.root.position.n, readouts, dur / readouts * 100.0, dur), flush=True)
+                player.root.position.n, searched, dur / searched * 100.0, dur),
+                flush=True)
+            if searched < readouts:
+                print("Early stop saved %d readouts" % (readouts - searched))
         if verbosity >= 3:
             print("Played >>",
                   coords.to_kgs(coords.from_flat(player.root.fmove)))
@@ -73,11 +73,15 @@ def make_sgf(
     Args:
         move_history: iterable of PlayerMoves
         result_string: "B+R", "W+0.5", etc.
-        comments: iterable of string/None. Will be zipped with move_history.
+        comments: iterable of string/None. Will be zipped with move_history;
+            if there are fewer comments than moves, the last moves have no
+            comment.
     '''
     boardsize = go.N
-    game_moves = ''.join(translate_sgf_move(*z)
-                         for z in itertools.zip_longest(move_history, comments))
+    game_moves = ''.join(translate_sgf_move(move, comment)
+                         for move, comment in itertools.zip_longest(
+                             move_history, comments)
+                         if move is not None)
     result = result_string
     return SGF_TEMPLATE.format(**locals())
 
@@ -177,6 +181,38 @@ def replay_sgf(sgf_contents):
         current_node = current_node.next
 
 
+def read_sgf_moves(sgf_contents):
+    '''Reads the moves of an SGF without replaying them, e.g. for
+    features.extract_game_features.
+
+    Returns:
+        (board, moves, result): the board after the root node's setup
+        stones, the PlayerMoves of the game (which replay_sgf would yield as
+        the next moves), and the result.
+    Raises:
+        ValueError if the root node has a move, or stones are added after the
+        root node.
+    '''
+    root_node = get_sgf_root_node(sgf_contents)
+    props = root_node.properties
+    assert int(sgf_prop(props.get('GM', ['1']))) == 1, "Not a Go SGF!"
+    if 'B' in props or 'W' in props:
+        raise ValueError("Move in the root node")
+    result = utils.parse_game_result(sgf_prop(props.get('RE', '')))
+
+    board = handle_node(Position(), root_node).board
+    moves = []
+    current_node = root_node
+    while current_node.next is not None:
+        next_props = current_node.next.properties
+        if 'AB' in next_props or 'AW' in next_props:
+            raise ValueError("Stones added during the game")
+        color = go.WHITE if 'W' in next_props else go.BLACK
+        moves.append(go.PlayerMove(color, get_next_move(current_node)))
+        current_node = current_node.next
+    return board, moves, result
+
+
 def replay_sgf_file(sgf_file):
     with open(sgf_file) as f:
         for pwc in replay_sgf(f.read()):
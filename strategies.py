@@ -12,18 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import os
 import random
 import sys
+import threading
 import time
+import traceback
 
 from absl import flags
 import numpy as np
 
+import adjudication
 import coords
 import go
 import mcts
+import mcts_gumbel
 import sgf_wrapper
+import time_manager
 
 from player_interface import MCTSPlayerInterface
 
@@ -45,8 +51,81 @@ flags.DEFINE_integer('parallel_readouts', 8,
                      'Number of searches to execute in parallel. This is also the batch size'
                      'for neural network evaluation.')
 
+flags.DEFINE_integer('position_cache_size', 0,
+                     'If positive, at most this many expanded nodes of the '
+                     'search tree keep their go.Position; the rest are '
+                     'recomputed on demand. 0 keeps every position.')
+flags.register_validator('position_cache_size', lambda x: x >= 0)
+
+flags.DEFINE_integer('stats_pool_block', 0,
+                     'If positive, the search tree keeps the child statistics '
+                     'of its nodes in preallocated arrays, added this many '
+                     'nodes at a time and reused for later moves and games, '
+                     'instead of allocating arrays for each node.')
+flags.register_validator('stats_pool_block', lambda x: x >= 0)
+
+flags.DEFINE_integer('max_tree_nodes', 0,
+                     'If positive, the least visited subtrees of the search '
+                     'tree are pruned whenever it grows beyond this many '
+                     'nodes. The subtrees kept for --undo_depth count too, '
+                     'and are discarded first. 0 lets the tree grow without '
+                     'limit.')
+flags.register_validator('max_tree_nodes', lambda x: x >= 0)
+
+flags.DEFINE_integer('transposition_table_size', 0,
+                     'If positive, remember the network evaluations of this '
+                     'many positions, and reuse them when a position is '
+                     'reached again by a different move order. 0 disables '
+                     'the table.')
+flags.register_validator('transposition_table_size', lambda x: x >= 0)
+
+flags.DEFINE_boolean('gumbel_search', False,
+                     'Choose root moves by Gumbel sampling and sequential '
+                     'halving instead of PUCT with Dirichlet noise, and train '
+                     'on the improved policy rather than visit counts. Works '
+                     'better than PUCT with few readouts.')
+
+flags.DEFINE_boolean('early_stop', False,
+                     'Stop searching a move once the most visited move can no '
+                     'longer be overtaken in the remaining readouts. Never '
+                     'used while moves are softpicked.')
+
+flags.DEFINE_float('early_stop_kl', 0,
+                   'If positive, also stop searching a move once the KL '
+                   'divergence between the root visit distributions before '
+                   'and after the last tenth of the readouts falls below '
+                   'this. Never used while moves are softpicked.')
+flags.register_validator('early_stop_kl', lambda x: x >= 0)
+
+flags.DEFINE_integer('undo_depth', 0,
+                     'Number of recent moves whose sibling subtrees (the '
+                     'search of the moves not played) are kept, so that undo '
+                     'restores them. Older moves can still be undone, with '
+                     'only the statistics of the moves themselves.')
+flags.register_validator('undo_depth', lambda x: x >= 0)
+
+flags.DEFINE_boolean('sgf_comments', True,
+                     'Keep the search statistics of each move for the '
+                     'comments of to_sgf. Without them, the comments only '
+                     'hold the root Q of each move.')
+
 FLAGS = flags.FLAGS
 
+# When the tree outgrows max_tree_nodes, prune it down to this fraction of the
+# budget so that we don't have to prune again on the very next search.
+PRUNE_TARGET_FRACTION = 0.9
+
+# The fraction of a move's readouts between two checks of early_stop_kl.
+KL_CHECK_FRACTION = 0.1
+
+# Pondering stops once the root has this many times num_readouts visits, so
+# that a long wait for the opponent doesn't grow the tree without bound.
+MAX_PONDER_FACTOR = 10
+
+# A move with at least this fraction of the visits of the most visited move
+# makes the root unstable if it has a better Q.
+UNSTABLE_VISIT_FRACTION = 0.25
+
 
 def time_recommendation(move_num, seconds_per_move=5, time_limit=15*60,
                         decay_factor=0.98):
@@ -77,10 +156,18 @@ def time_recommendation(move_num, seconds_per_move=5, time_limit=15*60,
     return base_time * decay_factor ** max(player_move_num - core_moves, 0)
 
 
+def kl_divergence(p, q):
+    "KL(p || q) of two distributions over moves; inf if q misses p's support."
+    support = p > 0
+    if np.any(q[support] == 0):
+        return np.inf
+    return np.sum(p[support] * np.log(p[support] / q[support]))
+
+
 class MCTSPlayer(MCTSPlayerInterface):
     def __init__(self, network, seconds_per_move=5, num_readouts=0,
                  resign_threshold=None, verbosity=0, two_player_mode=False,
-                 timed_match=False):
+                 timed_match=False, max_tree_nodes=None, gumbel_search=None):
         self.network = network
         self.seconds_per_move = seconds_per_move
         self.num_readouts = num_readouts or FLAGS.num_readouts
@@ -91,13 +178,48 @@ class MCTSPlayer(MCTSPlayerInterface):
         else:
             self.temp_threshold = FLAGS.softpick_move_cutoff
         self.qs = []
-        self.comments = []
+        # The mcts.SearchStats of each move's search (None if not kept), from
+        # which the comments are rendered.
+        self.move_stats = []
         self.searches_pi = []
+        # A go.PositionSnapshot of the root of each move in searches_pi.
+        self.snapshots = []
+        # Whether each move's search should be used for training.
+        self.training_moves = []
         self.root = None
+        self.position_cache = None
+        if FLAGS.stats_pool_block:
+            self.stats_pool = mcts.StatsPool(FLAGS.stats_pool_block)
+        else:
+            self.stats_pool = None
         self.result = 0
         self.result_string = None
+        # (winner, move number) of the adjudication that a holdout game
+        # would have had, see adjudication.py.
+        self.holdout_adjudication = None
         self.resign_threshold = resign_threshold or FLAGS.resign_threshold
         self.timed_match = timed_match
+        self.max_tree_nodes = max_tree_nodes or FLAGS.max_tree_nodes
+        self.gumbel_search = gumbel_search or FLAGS.gumbel_search
+        # The mcts_gumbel.SequentialHalving schedule of the current move.
+        self.halving = None
+        # Budgets the search time of each move under GTP time controls.
+        self.time_manager = time_manager.TimeManager()
+        self._ponder_thread = None
+        self._ponder_stop = None
+        # Set to make the search of the current command stop early, see
+        # gtp_engine.AsyncEngine.
+        self.interrupted = threading.Event()
+        # Upper bound on the size of the tree since it was last counted.
+        self._tree_size_bound = 0
+        # The previous roots that still have all their children, oldest
+        # first. See undo.
+        self._undo_roots = collections.deque()
+        if FLAGS.transposition_table_size:
+            self.transpositions = mcts.TranspositionTable(
+                FLAGS.transposition_table_size)
+        else:
+            self.transpositions = None
         assert (self.timed_match and self.seconds_per_move >
                 0) or self.num_readouts > 0
         super().__init__()
@@ -108,17 +230,87 @@ class MCTSPlayer(MCTSPlayerInterface):
     def get_root(self):
         return self.root
 
+    def get_tree_size(self):
+        """Returns the number of nodes in the current search tree, and in the
+        subtrees kept for undo."""
+        return self.root.tree_size() + sum(
+            child.tree_size()
+            for _, siblings in self._undo_siblings() for child in siblings)
+
+    def _undo_siblings(self):
+        """Yields each previous root in _undo_roots, oldest first, with the
+        children of the moves that weren't played from it."""
+        played = list(self._undo_roots)[1:] + [self.root]
+        for old_root, child in zip(self._undo_roots, played):
+            yield old_root, [sibling for sibling in old_root.children.values()
+                             if sibling is not child]
+
+    def _discard_oldest_undo_root(self):
+        """Only keeps the move played from the oldest root in _undo_roots, so
+        that undo can still get back to it.
+
+        Returns:
+            The number of nodes removed.
+        """
+        old_root, siblings = next(self._undo_siblings())
+        self._undo_roots.popleft()
+        removed = 0
+        for sibling in siblings:
+            removed += sibling.tree_size()
+            del old_root.children[sibling.fmove]
+            if self.stats_pool is not None:
+                self.stats_pool.release_subtree(sibling)
+        return removed
+
     def get_result_string(self):
         return self.result_string
 
-    def initialize_game(self, position=None):
+    def initialize_game(self, position=None, history=()):
+        '''Starts a new game at position (an empty board by default).
+
+        history: the earlier positions of the game, oldest first, e.g. from
+            an SGF. Each position one move after the previous one becomes an
+            ancestor of the root, so that undo can take its move back. Nodes
+            whose position is that of their parent plus the move only compute
+            it when it is needed.
+        '''
         if position is None:
             position = go.Position()
-        self.root = mcts.MCTSNode(position)
+        if FLAGS.position_cache_size:
+            self.position_cache = mcts.PositionCache(
+                FLAGS.position_cache_size)
+        else:
+            self.position_cache = None
+        if self.stats_pool is not None:
+            # The previous game's tree must not be used anymore.
+            self.stats_pool.reset()
+        positions = list(history) + [position]
+        # Setup stones don't add a move, so the chain of moves starts after
+        # the last of them.
+        start = len(positions) - 1
+        while start > 0 and positions[start].n == positions[start - 1].n + 1:
+            start -= 1
+        self.root = mcts.MCTSNode(positions[start],
+                                  position_cache=self.position_cache,
+                                  stats_pool=self.stats_pool)
+        for previous, current in zip(positions[start:], positions[start + 1:]):
+            # Keep the positions whose turn was corrected, as replay_sgf does
+            # when a player moves twice in a row.
+            known = (current is position or
+                     current.to_play != -previous.to_play)
+            self.root = self.root.maybe_add_child(
+                coords.to_flat(current.recent[-1].move),
+                position=current if known else None)
+        self._tree_size_bound = 1
+        self._undo_roots = collections.deque()
+        self.halving = None
         self.result = 0
         self.result_string = None
-        self.comments = []
+        self.holdout_adjudication = None
+        self.move_stats = []
         self.searches_pi = []
+        self.snapshots = []
+        self.training_moves = []
         self.qs = []
 
     def suggest_move(self, position):
@@ -127,17 +319,30 @@ class MCTSPlayer(MCTSPlayerInterface):
         incorporate_results, and pick_move
         '''
         start = time.time()
-
-        if self.timed_match:
-            while time.time() - start < self.seconds_per_move:
+        budget = self.time_manager.budget(
+            position.to_play, position.n, reused_readouts=self.root.N)
+
+        if budget is not None:
+            target, limit = budget
+            readouts = self.search_until(start + target, start + limit)
+            self.time_manager.record_move(
+                position.to_play, time.time() - start, readouts)
+            if self.verbosity > 0:
+                print("%d: Searched %d times in %.2f seconds (target %.2f)\n\n"
+                      % (position.n, readouts, time.time() - start, target),
+                      file=sys.stderr)
+        elif self.timed_match:
+            while (time.time() - start < self.seconds_per_move and
+                   not self.interrupted.is_set()):
                 self.tree_search()
         else:
-            current_readouts = self.root.N
-            while self.root.N < current_readouts + self.num_readouts:
-                self.tree_search()
+            readouts = self.search()
             if self.verbosity > 0:
                 print("%d: Searched %d times in %s seconds\n\n" % (
-                    position.n, self.num_readouts, time.time() - start), file=sys.stderr)
+                    position.n, readouts, time.time() - start), file=sys.stderr)
+                if readouts < self.num_readouts:
+                    print("Early stop saved %d readouts" % (
+                        self.num_readouts - readouts), file=sys.stderr)
 
         # print some stats on anything with probability > 1%
         if self.verbosity > 2:
@@ -148,37 +353,206 @@ class MCTSPlayer(MCTSPlayerInterface):
 
         return self.pick_move()
 
-    def play_move(self, c):
+    def search(self, num_readouts=None):
+        """Adds num_readouts readouts to the tree (self.num_readouts by
+        default), or fewer if early stopping is enabled and more readouts
+        wouldn't change the move picked, or if self.interrupted is set.
+
+        Returns:
+            The number of readouts actually performed.
+        """
+        if num_readouts is None:
+            num_readouts = self.num_readouts
+        start = self.root.N
+        target = start + num_readouts
+        if self.gumbel_search:
+            if not self.root.is_expanded:
+                self.tree_search(parallel_readouts=1)
+            self.halving = mcts_gumbel.SequentialHalving(
+                self.root, target - self.root.N)
+        # With softpick, every visit changes the odds of each move. Gumbel
+        # search doesn't pick the most visited move at all.
+        can_stop = (self.root.position.n >= self.temp_threshold and
+                    not self.gumbel_search)
+        check_kl = can_stop and FLAGS.early_stop_kl > 0
+        kl_interval = max(1, int(num_readouts * KL_CHECK_FRACTION))
+        next_kl_check = start + kl_interval
+        last_pi = None
+        while self.root.N < target:
+            self.tree_search()
+            if self.interrupted.is_set():
+                break
+            if not can_stop:
+                continue
+            if FLAGS.early_stop and self._lead_is_decisive(target - self.root.N):
+                break
+            if check_kl and self.root.N >= next_kl_check:
+                pi = self.root.children_as_pi()
+                if (last_pi is not None and
+                        kl_divergence(pi, last_pi) < FLAGS.early_stop_kl):
+                    break
+                last_pi = pi
+                next_kl_check = self.root.N + kl_interval
+        return self.root.N - start
+
+    def search_until(self, deadline, hard_deadline=None):
+        """Searches until deadline (a time.time() value), or, while the root
+        is unstable, until hard_deadline. Like search, stops early if
+        interrupted.
+
+        Returns:
+            The number of readouts performed.
+        """
+        if hard_deadline is None:
+            hard_deadline = deadline
+        start = self.root.N
+        while True:
+            # Always search a little, even when out of time.
+            self.tree_search()
+            now = time.time()
+            if now >= hard_deadline or self.interrupted.is_set():
+                break
+            if now >= deadline and not self.root_is_unstable():
+                break
+        return self.root.N - start
+
+    def root_is_unstable(self):
+        """True if the most visited move doesn't have the best Q among the
+        well visited moves, so more search might change the move played."""
+        child_N = self.root.child_N
+        best = np.argmax(child_N)
+        contenders = child_N >= child_N[best] * UNSTABLE_VISIT_FRACTION
+        q = np.where(contenders, self.root.child_Q * self.root.to_play,
+                     -np.inf)
+        return np.argmax(q) != best
+
+    def _lead_is_decisive(self, remaining):
+        "True if the most visited move stays so for any remaining readouts."
+        second, best = np.partition(self.root.child_N, -2)[-2:]
+        return best - second > remaining
+
+    def start_pondering(self):
+        """Keeps searching the current position in a background thread, e.g.
+        while the opponent is thinking, until stop_pondering is called.
+
+        Nothing else may use the player while it is pondering.
+        """
+        if self._ponder_thread is not None or self.root is None:
+            return
+        self._ponder_stop = threading.Event()
+        self._ponder_thread = threading.Thread(
+            target=self._ponder, args=(self._ponder_stop,), daemon=True)
+        self._ponder_thread.start()
+
+    def _ponder(self, stop):
+        max_readouts = self.num_readouts * MAX_PONDER_FACTOR
+        start = self.root.N
+        try:
+            while (not stop.is_set() and not self.root.is_done() and
+                   self.root.N < max_readouts):
+                self.tree_search()
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+        if self.verbosity > 1:
+            print("Pondered %d readouts" % (self.root.N - start),
+                  file=sys.stderr)
+
+    def stop_pondering(self):
+        """Stops pondering once the current batch of readouts is done.
+
+        The search tree is kept, so moves played next reuse the readouts.
+        """
+        if self._ponder_thread is None:
+            return
+        self._ponder_stop.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+
+    def play_move(self, c, for_training=True):
         '''
         Notable side effects:
           - finalizes the probability distribution according to
           this roots visit counts into the class' running tally, `searches_pi`
           - Makes the node associated with this move the root, for future
             `inject_noise` calls.
+
+        Moves played with for_training=False (e.g. after a deliberately
+        small search) are left out of extract_data.
         '''
-        if not self.two_player_mode:
-            self.searches_pi.append(
-                self.root.children_as_pi(self.root.position.n <= self.temp_threshold))
-        self.qs.append(self.root.Q)  # Save our resulting Q.
-        self.comments.append(self.root.describe())
-        try:
-            self.root = self.root.maybe_add_child(coords.to_flat(c))
-        except go.IllegalMove:
+        # Child nodes create their positions lazily, so check legality here
+        # rather than relying on maybe_add_child to raise go.IllegalMove.
+        if not self.root.position.is_move_legal(c):
             print("Illegal move")
-            if not self.two_player_mode:
-                self.searches_pi.pop()
-            self.qs.pop()
-            self.comments.pop()
             return False
+        if not self.two_player_mode:
+            if self.gumbel_search and self.root.is_expanded:
+                self.searches_pi.append(
+                    mcts_gumbel.improved_policy(self.root))
+            else:
+                self.searches_pi.append(
+                    self.root.children_as_pi(self.root.position.n <= self.temp_threshold))
+            self.snapshots.append(self.root.position.snapshot())
+            self.training_moves.append(for_training)
+        self.qs.append(self.root.Q)  # Save our resulting Q.
+        if FLAGS.sgf_comments:
+            self.move_stats.append(self.root.search_stats())
+        else:
+            self.move_stats.append(None)
+        self.root = self.root.maybe_add_child(coords.to_flat(c))
+        self.halving = None
         self.position = self.root.position  # for showboard
-        del self.root.parent.children
+        if self.position_cache is not None:
+            self.position_cache.pin(self.root)
+        self._undo_roots.append(self.root.parent)
+        while len(self._undo_roots) > FLAGS.undo_depth:
+            self._discard_oldest_undo_root()
         return True  # GTP requires positive result.
 
+    def undo(self):
+        '''Takes back the last move played.
+
+        The previous root becomes the root again, with its search statistics.
+        For the last --undo_depth moves, so do the subtrees of the moves that
+        weren't played.
+
+        Returns:
+            False if there is no move to take back.
+        '''
+        parent = self.root.parent
+        if not isinstance(parent, mcts.MCTSNode):
+            return False
+        if self._undo_roots and self._undo_roots[-1] is parent:
+            self._undo_roots.pop()
+        parent.children.setdefault(self.root.fmove, self.root)
+        self.root = parent
+        self.halving = None
+        self.position = self.root.position
+        if self.position_cache is not None:
+            self.position_cache.pin(self.root)
+        if self.max_tree_nodes:
+            self._tree_size_bound = self.get_tree_size()
+        # Only moves played since initialize_game have these.
+        if self.qs:
+            self.qs.pop()
+            self.move_stats.pop()
+            if not self.two_player_mode:
+                self.searches_pi.pop()
+                self.snapshots.pop()
+                self.training_moves.pop()
+        self.result = 0
+        self.result_string = None
+        return True
+
     def pick_move(self):
         '''Picks a move to play, based on MCTS readout statistics.
 
         Highest N is most robust indicator. In the early stage of the game, pick
-        a move weighted by visit count; later on, pick the absolute max.'''
+        a move weighted by visit count; later on, pick the absolute max.
+
+        With Gumbel search, the Gumbel noise already randomizes the move, and
+        the winner of sequential halving is picked.'''
+        if self.halving is not None:
+            return coords.from_flat(self.halving.best_move())
         if self.root.position.n >= self.temp_threshold:
             fcoord = np.argmax(self.root.child_N)
         else:
@@ -193,27 +567,109 @@ class MCTSPlayer(MCTSPlayerInterface):
         if parallel_readouts is None:
             parallel_readouts = FLAGS.parallel_readouts
         leaves = []
+        # Index in leaves of every distinct leaf in the batch.
+        leaf_index = {}
+        # Every selection, including repeated selections of the same leaf.
+        # These keep their virtual loss until the batch is incorporated, so
+        # that further selections are steered elsewhere.
+        selected = []
         failsafe = 0
         while len(leaves) < parallel_readouts and failsafe < parallel_readouts * 2:
             failsafe += 1
-            leaf = self.root.select_leaf()
+            leaf = self.select_leaf()
             if self.verbosity >= 4:
                 print(self.show_path_to_root(leaf))
             # if game is over, override the value estimate with the true score
             if leaf.is_done():
-                value = 1 if leaf.position.score() > 0 else -1
-                leaf.backup_value(value, up_to=self.root)
+                leaf.backup_value(leaf.terminal_value, up_to=self.root)
                 continue
             leaf.add_virtual_loss(up_to=self.root)
-            leaves.append(leaf)
+            selected.append(leaf)
+            if leaf not in leaf_index:
+                leaf_index[leaf] = len(leaves)
+                leaves.append(leaf)
         if leaves:
-            move_probs, values = self.network.run_many(
+            move_probs, values = self.evaluate_positions(
                 [leaf.position for leaf in leaves])
-            for leaf, move_prob, value in zip(leaves, move_probs, values):
-                leaf.revert_virtual_loss(up_to=self.root)
-                leaf.incorporate_results(move_prob, value, up_to=self.root)
+            # Only the first copy of a repeated leaf is expanded; the others
+            # just have their virtual losses and visits reverted.
+            indices = [leaf_index[leaf] for leaf in selected]
+            mcts.incorporate_batch(selected,
+                                   [move_probs[i] for i in indices],
+                                   [values[i] for i in indices],
+                                   up_to=self.root)
+        if self.max_tree_nodes:
+            # Each select_leaf adds at most one node to the tree.
+            self._tree_size_bound += failsafe
+            if self._tree_size_bound > self.max_tree_nodes:
+                self.maybe_prune_tree()
         return leaves
 
+    def select_leaf(self):
+        "Selects a leaf, choosing the root move by Gumbel search if enabled."
+        if not (self.gumbel_search and self.root.is_expanded):
+            return self.root.select_leaf()
+        if self.halving is None:
+            self.halving = mcts_gumbel.SequentialHalving(
+                self.root, self.num_readouts)
+        self.root.N += 1
+        child = self.root.maybe_add_child(self.halving.next_move())
+        return child.select_leaf()
+
+    def evaluate_positions(self, positions):
+        """Runs the network on positions.
+
+        With a transposition table, positions that were evaluated before (or
+        that appear more than once) are only sent to the network once.
+
+        Returns:
+            (move_probabilities, values), one of each per position.
+        """
+        if self.transpositions is None:
+            return self.network.run_many(positions)
+        move_probs = [None] * len(positions)
+        values = [None] * len(positions)
+        misses = {}  # key -> indices of the positions with that key
+        for i, position in enumerate(positions):
+            key = self.transpositions.key(position)
+            entry = self.transpositions.get(key) if key not in misses else None
+            if entry is None:
+                misses.setdefault(key, []).append(i)
+            else:
+                move_probs[i], values[i] = entry
+        if misses:
+            new_probs, new_values = self.network.run_many(
+                [positions[indices[0]] for indices in misses.values()])
+            for (key, indices), probs, value in zip(
+                    misses.items(), new_probs, new_values):
+                self.transpositions.put(key, probs, value)
+                for i in indices:
+                    move_probs[i] = probs
+                    values[i] = value
+        return move_probs, values
+
+    def maybe_prune_tree(self):
+        """Prunes the least visited subtrees if the tree is over budget.
+
+        The subtrees kept for undo are discarded first, oldest first.
+
+        Returns:
+            The number of nodes removed.
+        """
+        size = self.get_tree_size()
+        removed = 0
+        if size > self.max_tree_nodes:
+            target = int(self.max_tree_nodes * PRUNE_TARGET_FRACTION)
+            while self._undo_roots and size - removed > target:
+                removed += self._discard_oldest_undo_root()
+            if not self._undo_roots:
+                removed += self.root.prune_subtrees(target)
+            if self.verbosity > 1:
+                print("Pruned %d of %d search tree nodes" % (removed, size),
+                      file=sys.stderr)
+        self._tree_size_bound = size - removed
+        return removed
+
     def show_path_to_root(self, node):
         pos = node.position
         diff = node.position.n - self.root.position.n
@@ -236,21 +692,39 @@ class MCTSPlayer(MCTSPlayerInterface):
         '''Returns true if the player resigned.  No further moves should be played'''
         return self.root.Q_perspective < self.resign_threshold
 
-    def set_result(self, winner, was_resign):
+    def set_result(self, winner, was_resign, was_adjudicated=False):
         self.result = winner
         if was_resign:
             string = "B+R" if winner == go.BLACK else "W+R"
+        elif was_adjudicated:
+            string = "B+Adj" if winner == go.BLACK else "W+Adj"
         else:
             string = self.root.position.result_string()
         self.result_string = string
 
+    @property
+    def comments(self):
+        '''The SGF comment of each searched move. The first line is always the
+        root Q, which resign calibration reads.'''
+        return [mcts.describe_stats(stats) if stats is not None
+                else "{:.4f}".format(q)
+                for q, stats in zip(self.qs, self.move_stats)]
+
     def to_sgf(self, use_comments=True):
         assert self.result_string is not None
         pos = self.root.position
         if use_comments:
             comments = self.comments or ['No comments.']
-            comments[0] = ("Resign Threshold: %0.3f\n" %
-                           self.resign_threshold) + comments[0]
+            # Moves of the initial position (e.g. loaded from an SGF) weren't
+            # searched, and have no comments.
+            num_unsearched = max(0, len(pos.recent) - len(comments))
+            comments = [None] * num_unsearched + comments
+            header = "Resign Threshold: %0.3f\n" % self.resign_threshold
+            if self.holdout_adjudication is not None:
+                winner, move_number = self.holdout_adjudication
+                header += adjudication.HOLDOUT_COMMENT.format(
+                    'B' if winner == go.BLACK else 'W', move_number)
+            comments[0] = header + (comments[0] or '')
         else:
             comments = []
         return sgf_wrapper.make_sgf(pos.recent, self.result_string,
@@ -261,11 +735,27 @@ class MCTSPlayer(MCTSPlayerInterface):
                                     comments=comments)
 
     def extract_data(self):
+        '''Yields a (go.PositionSnapshot, pi, result) tuple for each move
+        searched for training, from the snapshots taken as the game was
+        played.'''
+        assert len(self.searches_pi) == self.root.position.n
+        assert self.result != 0
+        for snapshot, pi, for_training in zip(
+                self.snapshots, self.searches_pi, self.training_moves):
+            if for_training:
+                yield snapshot, pi, self.result
+
+    def extract_game_record(self):
+        '''Returns (moves, training_pis, result, komi) for
+        preprocessing.make_game_record: the go.PlayerMoves of the game, and
+        a (move number, pi) pair for each move searched for training.'''
         assert len(self.searches_pi) == self.root.position.n
         assert self.result != 0
-        for pwc, pi in zip(go.replay_position(self.root.position, self.result),
-                           self.searches_pi):
-            yield pwc.position, pi, pwc.result
+        training_pis = [
+            (i, pi) for i, (pi, for_training) in enumerate(
+                zip(self.searches_pi, self.training_moves)) if for_training]
+        position = self.root.position
+        return position.recent, training_pis, self.result, position.komi
 
     def get_num_readouts(self):
         return self.num_readouts
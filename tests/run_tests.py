@@ -5,16 +5,22 @@ import unittest
 # Importing all of these modules causes all the relevant flags to get defined.
 # They thus become overrideable, either with cmd line args to run_tests or via
 # the test_flags file.
+import test_adjudication
 import test_coords
 import test_dual_net
 import test_features
 import test_go
+import test_gtp_cmd_handlers
+import test_gtp_engine
 import test_mcts
+import test_mcts_gumbel
 import test_preprocessing
+import test_resign_calibration
 import test_sgf_wrapper
 import test_shipname
 import test_strategies
 import test_symmetries
+import test_time_manager
 import test_utils
 
 from absl import flags
@@ -0,0 +1,56 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import adjudication
+import go
+from tests import test_utils
+
+BLACK_AHEAD = go.Position(board=test_utils.load_board('''
+    .X.X.....
+    XXXX.....
+    .........
+    .........
+    .........
+    .........
+    .........
+    .........
+    ......OOO
+'''), komi=0.5)
+
+
+class TestAdjudication(test_utils.MiniGoUnitTest):
+    def test_adjudicator(self):
+        adjudicator = adjudication.Adjudicator(num_moves=3, q_threshold=0.9)
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.95), 0)
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.92), 0)
+        # The search isn't confident enough; start again.
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.5), 0)
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.95), 0)
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.95), 0)
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, 0.95), go.BLACK)
+
+    def test_adjudicator_disagreement(self):
+        adjudicator = adjudication.Adjudicator(num_moves=1, q_threshold=0.9)
+        # White's search is confident, but black is ahead on the board.
+        self.assertEqual(adjudicator.update(BLACK_AHEAD, -0.95), 0)
+        self.assertEqual(adjudicator.update(go.Position(komi=6.5), -0.95),
+                         go.WHITE)
+
+    def test_holdout_accuracy(self):
+        games = [
+            '(;RE[B+R]C[Adjudication holdout: B at move 80\n0.95])',
+            '(;RE[W+3.5]C[Adjudication holdout: B at move 91\n0.95])',
+            '(;RE[W+R]C[0.95])',
+        ]
+        self.assertEqual(adjudication.holdout_accuracy(games), (2, 1))
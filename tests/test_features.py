@@ -150,3 +150,73 @@ class TestFeatureExtraction(test_utils.MiniGoUnitTest):
         # move at (0, 7) would capture 3 stones
         self.assertEqual(f[0, 7, 2], 1)
         self.assertEqual(f[0, 7, 1], 0)
+
+    def test_extract_game_features(self):
+        # Black captures at (0, 1) and (1, 0), white retakes the corner, and
+        # both players pass in the middle of the game.
+        moves = [go.PlayerMove(go.BLACK, (0, 1)),
+                 go.PlayerMove(go.WHITE, (0, 0)),
+                 go.PlayerMove(go.BLACK, (1, 0)),
+                 go.PlayerMove(go.WHITE, (1, 1)),
+                 go.PlayerMove(go.BLACK, None),
+                 go.PlayerMove(go.WHITE, (0, 2)),
+                 go.PlayerMove(go.BLACK, (4, 4)),
+                 go.PlayerMove(go.WHITE, (2, 0)),
+                 go.PlayerMove(go.BLACK, None),
+                 go.PlayerMove(go.WHITE, (0, 0)),
+                 go.PlayerMove(go.BLACK, (5, 5)),
+                 go.PlayerMove(go.WHITE, None)]
+        position = go.Position()
+        expected = []
+        for move in moves:
+            expected.append(features.extract_features(position))
+            position = position.play_move(move.move)
+        self.assertEqual(position.caps, (1, 2))
+
+        f = features.extract_game_features(moves)
+        self.assertEqual(f.dtype, np.uint8)
+        self.assertEqualNPArray(f, np.array(expected, dtype=np.uint8))
+
+    def test_extract_game_features_indices(self):
+        moves = [go.PlayerMove(go.BLACK, (0, 1)),
+                 go.PlayerMove(go.WHITE, (0, 0)),
+                 go.PlayerMove(go.BLACK, (1, 0)),
+                 go.PlayerMove(go.WHITE, None),
+                 go.PlayerMove(go.BLACK, (4, 4)),
+                 go.PlayerMove(go.WHITE, (4, 5))]
+        all_features = features.extract_game_features(moves)
+        f = features.extract_game_features(moves, indices=[4, 0, 3])
+        self.assertEqualNPArray(f, all_features[[4, 0, 3]])
+        f = features.extract_game_features(moves, indices=[])
+        self.assertEqual(f.shape, (0, go.N, go.N, features.NEW_FEATURES_PLANES))
+
+    def test_extract_game_features_from_board(self):
+        # As with an SGF whose root node sets up handicap stones.
+        position = go.Position(board=TEST_BOARD2, to_play=go.WHITE)
+        moves = [go.PlayerMove(go.WHITE, (1, 2)),
+                 go.PlayerMove(go.BLACK, (0, 0)),
+                 go.PlayerMove(go.WHITE, (0, 7))]
+        expected = []
+        for move in moves:
+            expected.append(features.extract_features(position))
+            position = position.play_move(move.move)
+
+        f = features.extract_game_features(moves, board=TEST_BOARD2)
+        self.assertEqualNPArray(f, np.array(expected, dtype=np.uint8))
+
+    def test_bulk_extract_features(self):
+        positions = [TEST_POSITION, TEST_POSITION2, TEST_POSITION3]
+        position = go.Position()
+        for move in [(0, 1), (0, 0), (1, 0), (1, 1), None, (0, 2), (4, 4),
+                     (2, 0), None, (0, 0), (5, 5), (6, 6)]:
+            position = position.play_move(move)
+            positions.append(position)
+        # As in MCTSPlayer.extract_data.
+        positions.append(position.snapshot())
+
+        f = features.bulk_extract_features(positions)
+        self.assertEqual(f.dtype, np.uint8)
+        self.assertEqualNPArray(
+            f, np.array([features.extract_features(p) for p in positions]))
+        self.assertEqual(features.bulk_extract_features([]).shape,
+                         (0, go.N, go.N, features.NEW_FEATURES_PLANES))
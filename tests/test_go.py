@@ -582,6 +582,50 @@ class TestPosition(test_utils.MiniGoUnitTest):
         expected_score = 2.5
         self.assertEqual(position.score(), expected_score)
 
+    def test_pass_alive(self):
+        board = test_utils.load_board('''
+            .X.XO....
+            XXXXO....
+            OOOOO....
+            .........
+            .........
+            .........
+            .........
+            .....XX..
+            .....X.X.
+        ''')
+        alive = go.find_pass_alive(board, BLACK)
+        # The corner group has two eyes; the group at the bottom has one.
+        self.assertEqual(np.count_nonzero(alive), 8)
+        self.assertTrue(alive[0, 0] and alive[0, 2] and alive[1, 3])
+        self.assertFalse(alive[7, 5])
+        self.assertFalse(alive[3, 3])
+        # White has no eyes at all.
+        self.assertFalse(np.any(go.find_pass_alive(board, WHITE)))
+
+        position = Position(board=board)
+        pass_alive = position.pass_alive()
+        self.assertEqual(np.count_nonzero(pass_alive == BLACK), 8)
+        self.assertEqual(np.count_nonzero(pass_alive == WHITE), 0)
+
+    def test_estimated_score(self):
+        board = test_utils.load_board('''
+            O.X.X....
+            XXXXX....
+            .........
+            .........
+            .........
+            .........
+            .........
+            .........
+            .........
+        ''')
+        position = Position(board=board, komi=6.5)
+        # Tromp-Taylor counts the white stone in black's eye as alive and the
+        # point next to it as neutral.
+        self.assertEqual(position.score(), 79 - 1 - 6.5)
+        self.assertEqual(position.estimated_score(), 81 - 6.5)
+
     def test_replay_position(self):
         sgf_positions = list(sgf_wrapper.replay_sgf(NO_HANDICAP_SGF))
         initial = sgf_positions[0]
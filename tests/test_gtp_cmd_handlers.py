@@ -0,0 +1,143 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import io
+import json
+
+import go
+import gtp_cmd_handlers
+import sgf_wrapper
+from strategies import MCTSPlayer
+from tests import test_utils
+from tests.test_strategies import DummyNet
+
+
+class TestAnalysisCmdHandler(test_utils.MiniGoUnitTest):
+    def test_candidates_winrate(self):
+        # Expansion seeds the children's W with the network's value, so the
+        # winrate must come from child_Q rather than W / N.
+        player = MCTSPlayer(DummyNet(fake_value=0.9))
+        player.initialize_game()
+        handler = gtp_cmd_handlers.AnalysisCmdHandler(player)
+        for i in range(4):
+            player.tree_search()
+        candidates = list(handler._candidates())
+        self.assertTrue(candidates)
+        for order, move, visits, winrate, prior, pv in candidates:
+            self.assertAlmostEqual(winrate, 0.95, places=5)
+            info = handler._lz_info(order, move, visits, winrate, prior, pv)
+            lz_winrate = int(info.split(" winrate ")[1].split()[0])
+            self.assertTrue(0 <= lz_winrate <= 10000)
+
+        # White to play sees black's 0.9 as a 5% winrate.
+        player.play_move(player.pick_move())
+        player.tree_search()
+        for _, _, _, winrate, _, _ in handler._candidates():
+            self.assertAlmostEqual(winrate, 0.05, places=5)
+
+
+class TestMiniguiCmdHandler(test_utils.MiniGoUnitTest):
+    def report_status(self, handler, leaves=None):
+        output = io.StringIO()
+        with contextlib.redirect_stderr(output):
+            handler._minigui_report_search_status(leaves)
+        prefix, status = output.getvalue().strip().split(":", 1)
+        self.assertEqual(prefix, "mg-status")
+        return json.loads(status)
+
+    def test_search_status_deltas(self):
+        player = MCTSPlayer(DummyNet(fake_value=0.5))
+        handler = gtp_cmd_handlers.MiniguiCmdHandler(player)
+        leaves = player.tree_search()
+
+        full = self.report_status(handler, leaves)
+        self.assertEqual(full["full"], 1)
+        root = player.get_root()
+        self.assertEqual(len(full["n"]), (root.child_N > 0).sum())
+        for i, n in full["n"].items():
+            self.assertEqual(n, root.child_N[int(i)])
+        self.assertEqual(full["rootq"], round(root.Q * 1000))
+
+        # Nothing changed: nothing but the root Q and the PV is sent.
+        unchanged = self.report_status(handler)
+        self.assertNotIn("full", unchanged)
+        self.assertEqual(unchanged["n"], {})
+        self.assertEqual(unchanged["q"], {})
+
+        player.tree_search()
+        delta = self.report_status(handler)
+        self.assertNotIn("full", delta)
+        self.assertTrue(delta["n"])
+        for i, n in delta["n"].items():
+            self.assertEqual(n, root.child_N[int(i)])
+        self.assertLess(len(delta["n"]), go.N * go.N + 1)
+
+        # A new root starts over.
+        player.play_move(player.pick_move())
+        player.tree_search()
+        self.assertEqual(self.report_status(handler)["full"], 1)
+
+
+class TestRegressionsCmdHandler(test_utils.MiniGoUnitTest):
+    def test_loadsgf(self):
+        net = DummyNet()
+        net.save_file = "dummy"
+        player = MCTSPlayer(net)
+        basic = gtp_cmd_handlers.BasicCmdHandler(player)
+        handler = gtp_cmd_handlers.RegressionsCmdHandler(player)
+        basic.cmd_komi(7.5)
+        handler.cmd_loadsgf("tests/example_game.sgf")
+        root = player.get_root()
+        self.assertEqual(root.position.n, 37)
+        self.assertEqual(root.position.komi, 7.5)
+        self.assertEqual(player.comments, [])
+        # The loaded moves are unexpanded ancestors of the root, which only
+        # compute their positions when needed.
+        ancestors = []
+        node = root.parent
+        while node.parent is not None:
+            self.assertFalse(node.is_expanded)
+            ancestors.append(node)
+            node = node.parent
+        self.assertEqual(len(ancestors), 37)
+        self.assertIsNone(ancestors[0]._position)
+
+        # So they can be undone.
+        with open("tests/example_game.sgf") as f:
+            pwcs = list(sgf_wrapper.replay_sgf(f.read()))
+        basic.cmd_undo()
+        basic.cmd_undo()
+        position = player.get_position()
+        self.assertEqual(position.n, 35)
+        self.assertEqualNPArray(position.board, pwcs[35].position.board)
+        self.assertEqual(position.to_play, pwcs[35].position.to_play)
+        self.assertEqual(position.komi, 7.5)
+        for i in range(35):
+            basic.cmd_undo()
+        self.assertEqual(player.get_position().n, 0)
+        with self.assertRaises(ValueError):
+            basic.cmd_undo()
+
+        handler.cmd_loadsgf("tests/example_game.sgf", 9)
+        self.assertEqual(player.get_position().n, 10)
+
+        # Moves played after loading are commented, the loaded ones aren't.
+        player.search(8)
+        player.play_move(player.pick_move())
+        player.set_result(go.BLACK, was_resign=True)
+        sgf = player.to_sgf()
+        self.assertEqual(sgf.count("C["), 2)
+        self.assertIn(";B[de]C[Resign Threshold", sgf)
+        self.assertEqual(sgf.count(";B["), 6)
@@ -0,0 +1,128 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import io
+import time
+
+import gtp_cmd_handlers
+import gtp_engine
+from strategies import MCTSPlayer
+from tests import test_utils
+from tests.test_strategies import DummyNet
+
+
+def slow_stream(*msgs, delay=0.2):
+    "Yields each message after the previous one has had time to run."
+    for msg in msgs:
+        yield msg + "\n"
+        time.sleep(delay)
+
+
+class TestAsyncEngine(test_utils.MiniGoUnitTest):
+    def make_engine(self):
+        player = MCTSPlayer(DummyNet(), num_readouts=10000)
+        engine = gtp_engine.AsyncEngine(player)
+        engine.add_cmd_handler(
+            gtp_engine.EngineCmdHandler(engine, "test", "0"))
+        engine.add_cmd_handler(gtp_cmd_handlers.BasicCmdHandler(player))
+        engine.add_cmd_handler(gtp_cmd_handlers.AnalysisCmdHandler(player))
+        return engine, player
+
+    def run_engine(self, engine, stream):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            engine.run(stream)
+        return output.getvalue()
+
+    def test_analysis_is_interrupted_by_next_command(self):
+        engine, player = self.make_engine()
+        output = self.run_engine(engine, slow_stream(
+            "1 lz-analyze b 5", "2 name", "quit"))
+        lines = output.split("\n")
+        self.assertEqual(lines[0], "= 1")
+        self.assertTrue(lines[1].startswith("info move "))
+        self.assertIn(" visits ", lines[1])
+        self.assertIn(" pv ", lines[1])
+        # The stream ends with an empty line, then the next command runs.
+        end = lines.index("")
+        self.assertTrue(all(l.startswith("info ") for l in lines[1:end]))
+        self.assertEqual(lines[end + 1], "= 2 test")
+        self.assertGreater(player.get_root().N, 0)
+
+    def test_analysis_is_interrupted_by_queued_command(self):
+        engine, player = self.make_engine()
+        # All the commands arrive at once, and are queued before the analysis
+        # starts.
+        handle_msg = engine.handle_msg
+
+        def slow_handle_msg(msg):
+            time.sleep(0.05)
+            return handle_msg(msg)
+        engine.handle_msg = slow_handle_msg
+        start = time.time()
+        output = self.run_engine(
+            engine, ["1 lz-analyze b 5\n", "2 name\n", "quit\n"])
+        self.assertLess(time.time() - start, 10)
+        lines = output.split("\n")
+        self.assertEqual(lines[0], "= 1")
+        end = lines.index("")
+        self.assertEqual(lines[end + 1], "= 2 test")
+        self.assertEqual(lines[end + 3], "=")
+
+    def test_analysis_is_interrupted_by_end_of_input(self):
+        engine, _ = self.make_engine()
+        start = time.time()
+        output = self.run_engine(engine, slow_stream("1 lz-analyze b 5"))
+        self.assertLess(time.time() - start, 10)
+        lines = output.split("\n")
+        self.assertEqual(lines[0], "= 1")
+        self.assertTrue(lines[1].startswith("info move "))
+
+    def test_queued_analysis_is_interrupted_by_end_of_input(self):
+        engine, _ = self.make_engine()
+        handle_msg = engine.handle_msg
+
+        def slow_handle_msg(msg):
+            time.sleep(0.05)
+            return handle_msg(msg)
+        engine.handle_msg = slow_handle_msg
+        start = time.time()
+        output = self.run_engine(engine, ["1 kata-analyze b 5\n"])
+        self.assertLess(time.time() - start, 10)
+        self.assertTrue(output.startswith("= 1"))
+
+    def test_queued_command_does_not_interrupt_genmove(self):
+        engine, player = self.make_engine()
+        player.num_readouts = 50
+        output = self.run_engine(
+            engine, ["1 genmove b\n", "2 name\n"])
+        self.assertTrue(output.startswith("= 1 "))
+        self.assertIn("= 2 test", output)
+        self.assertGreaterEqual(player.get_root().parent.N, 50)
+
+    def test_stop_interrupts_genmove(self):
+        engine, player = self.make_engine()
+        start = time.time()
+        output = self.run_engine(engine, slow_stream(
+            "1 genmove b", "2 stop", "quit", delay=0.05))
+        self.assertLess(time.time() - start, 10)
+        self.assertTrue(output.startswith("= 1 "))
+        self.assertIn("= 2", output)
+        self.assertLess(player.get_root().parent.N, 10000)
+
+    def test_analyze_rejects_other_color(self):
+        engine, _ = self.make_engine()
+        output = self.run_engine(engine, ["1 kata-analyze w 5\n"])
+        self.assertTrue(output.startswith("? 1"))
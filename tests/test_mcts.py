@@ -14,6 +14,7 @@
 
 import copy
 import unittest
+import unittest.mock as mock
 import numpy as np
 
 import coords
@@ -142,6 +143,17 @@ class TestMctsNodes(test_utils.MiniGoUnitTest):
         # should just stop exploring at the end position.
         self.assertEqual(node_to_explore, second_pass)
 
+    def test_terminal_value(self):
+        root = mcts.MCTSNode(TEST_POSITION)
+        node = root.maybe_add_child(go.N * go.N).maybe_add_child(go.N * go.N)
+        self.assertTrue(node.is_done())
+        with mock.patch.object(go.Position, 'score',
+                               autospec=True, return_value=-2.5) as score:
+            self.assertEqual(node.terminal_value, -1)
+            self.assertEqual(node.terminal_value, -1)
+            self.assertTrue(node.is_done())
+        self.assertEqual(score.call_count, 1)
+
     def test_add_child(self):
         root = mcts.MCTSNode(go.Position())
         child = root.maybe_add_child(17)
@@ -192,3 +204,266 @@ class TestMctsNodes(test_utils.MiniGoUnitTest):
         # hasn't yet been sent to neural net for eval + result incorporation
         leaf2 = root.select_leaf()
         self.assertIs(leaf1, leaf2)
+
+    def test_lazy_leaf_statistics(self):
+        probs = np.array([0.02] * (go.N * go.N + 1))
+        root = mcts.MCTSNode(go.Position())
+        root.select_leaf().incorporate_results(probs, 0, root)
+        leaf = root.select_leaf()
+        # A freshly selected leaf only knows its parent and move...
+        self.assertIsNone(leaf._position)
+        self.assertIs(leaf.child_N, mcts._NO_STATS)
+        with self.assertRaises(ValueError):
+            leaf.child_N[0] += 1
+        # ...until its position is needed, or it is expanded.
+        self.assertEqual(leaf.position.recent[-1].move,
+                         coords.from_flat(leaf.fmove))
+        leaf.incorporate_results(probs, 0, root)
+        self.assertEqual(leaf.child_N.shape, (go.N * go.N + 1,))
+        self.assertEqualNPArray(
+            leaf.illegal_moves, 1000 * (1 - leaf.position.all_legal_moves()))
+
+    def test_add_child_to_unexpanded_node(self):
+        root = mcts.MCTSNode(go.Position())
+        child = root.maybe_add_child(17)
+        child.N += 1
+        self.assertEqual(root.child_N[17], 1)
+        self.assertFalse(root.is_expanded)
+
+    def test_position_cache(self):
+        np.random.seed(1)
+        cache = mcts.PositionCache(5)
+        root = mcts.MCTSNode(go.Position(), position_cache=cache)
+        reference = mcts.MCTSNode(go.Position())
+        for i in range(40):
+            probs = np.random.random([go.N * go.N + 1]).astype(np.float32)
+            value = np.random.random() * 2 - 1
+            leaf = root.select_leaf()
+            reference_leaf = reference.select_leaf()
+            self.assertEqual(leaf.position.recent,
+                             reference_leaf.position.recent)
+            leaf.incorporate_results(probs, value, up_to=root)
+            reference_leaf.incorporate_results(probs, value, up_to=reference)
+        self.assertLessEqual(len(cache), 5)
+        self.assertEqualNPArray(root.child_N, reference.child_N)
+        self.assertIsNotNone(root._position)
+
+        # Evicted positions are replayed from the nearest retained ancestor.
+        num_evicted = 0
+        queue = [(root, reference)]
+        while queue:
+            node, reference_node = queue.pop()
+            if node.is_expanded and node._position is None:
+                num_evicted += 1
+                self.assertEqual(node.to_play, reference_node.to_play)
+                self.assertEqualPositions(
+                    node.position, reference_node.position)
+            for fmove, child in node.children.items():
+                queue.append((child, reference_node.children[fmove]))
+        self.assertGreater(num_evicted, 0)
+
+    def test_position_cache_pin(self):
+        cache = mcts.PositionCache(1)
+        root = mcts.MCTSNode(go.Position(), position_cache=cache)
+        child = root.maybe_add_child(17)
+        grandchild = child.maybe_add_child(18)
+        other = root.maybe_add_child(19)
+        cache.pin(child)
+        for node in (child, grandchild, other):
+            node.position
+            cache.touch(node)
+        # The pinned node is never tracked, so only grandchild was evicted.
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(grandchild._position)
+        self.assertIsNotNone(other._position)
+        self.assertIsNotNone(child._position)
+        self.assertIsNotNone(root._position)
+        self.assertEqual(grandchild.to_play, go.BLACK)
+
+    def test_position_cache_keeps_turn_corrections(self):
+        cache = mcts.PositionCache(1)
+        root = mcts.MCTSNode(go.Position(), position_cache=cache)
+        # Black plays twice in a row, as replay_sgf allows.
+        corrected = go.Position().play_move(coords.from_flat(17))
+        corrected.flip_playerturn(mutate=True)
+        child = root.maybe_add_child(17, position=corrected)
+        grandchild = child.maybe_add_child(18)
+        other = root.maybe_add_child(19)
+        for node in (child, grandchild, other):
+            node.position
+            cache.touch(node)
+        # Replaying child's move wouldn't give black to play, so it keeps its
+        # position, and grandchild is replayed from it.
+        self.assertIs(child._position, corrected)
+        self.assertIsNone(grandchild._position)
+        self.assertEqual(child.to_play, go.BLACK)
+        self.assertEqual(grandchild.to_play, go.WHITE)
+        self.assertEqual(grandchild.position.recent[-1],
+                         go.PlayerMove(go.BLACK, coords.from_flat(18)))
+
+    def test_transposition_table(self):
+        table = mcts.TranspositionTable(2)
+        probs = np.array([.02] * (go.N * go.N + 1))
+        order1 = go.Position().play_move((0, 0)).play_move(
+            (1, 1)).play_move((2, 2))
+        order2 = go.Position().play_move((2, 2)).play_move(
+            (1, 1)).play_move((0, 0))
+        self.assertEqual(table.key(order1), table.key(order2))
+        self.assertNotEqual(table.key(order1),
+                            table.key(order1.flip_playerturn()))
+
+        self.assertIsNone(table.get(table.key(order1)))
+        table.put(table.key(order1), probs, 0.5)
+        self.assertEqual(table.get(table.key(order2)), (probs, 0.5))
+        self.assertEqual((table.hits, table.misses), (1, 1))
+
+        # The least recently used entry is dropped.
+        table.put(table.key(go.Position()), probs, 0)
+        table.get(table.key(order1))
+        table.put(table.key(go.Position().pass_move()), probs, 0)
+        self.assertEqual(len(table), 2)
+        self.assertIsNone(table.get(table.key(go.Position())))
+        self.assertIsNotNone(table.get(table.key(order1)))
+
+    def test_prune_subtrees(self):
+        np.random.seed(1)
+        root = mcts.MCTSNode(go.Position())
+        for i in range(60):
+            probs = np.random.random([go.N * go.N + 1]).astype(np.float32)
+            leaf = root.select_leaf()
+            leaf.incorporate_results(probs, np.random.random() * 2 - 1, root)
+        size = root.tree_size()
+        self.assertEqual(size, 60)
+        child_N = np.copy(root.child_N)
+        child_W = np.copy(root.child_W)
+
+        removed = root.prune_subtrees(20)
+        self.assertEqual(root.tree_size(), size - removed)
+        self.assertLessEqual(root.tree_size(), 20)
+        # Statistics of the collapsed children are kept in the parent...
+        self.assertEqualNPArray(root.child_N, child_N)
+        self.assertEqualNPArray(root.child_W, child_W)
+        # ...and the most visited children survive.
+        self.assertIn(np.argmax(root.child_N), root.children)
+        self.assertEqual(root.prune_subtrees(20), 0)
+
+        # Searching again recreates collapsed children as unexpanded leaves.
+        for i in range(20):
+            leaf = root.select_leaf()
+            if leaf.is_expanded:
+                leaf.revert_visits(up_to=root)
+                continue
+            leaf.incorporate_results(probs, 0, root)
+        self.assertEqual(root.N, 80)
+
+    def test_incorporate_batch(self):
+        np.random.seed(1)
+        probs = np.random.random([go.N * go.N + 1]).astype(np.float32)
+        roots = [mcts.MCTSNode(go.Position()) for i in range(2)]
+        for root in roots:
+            root.select_leaf().incorporate_results(probs, 0.1, root)
+        for i in range(5):
+            batches = []
+            for root in roots:
+                leaves = []
+                for j in range(4):
+                    leaf = root.select_leaf()
+                    leaf.add_virtual_loss(up_to=root)
+                    leaves.append(leaf)
+                batches.append(leaves)
+            # The same leaves are selected in both trees, some of them twice.
+            self.assertEqual([l.fmove for l in batches[0]],
+                             [l.fmove for l in batches[1]])
+            values = np.random.random([4]) * 2 - 1
+            for leaf, value in zip(batches[0], values):
+                leaf.revert_virtual_loss(up_to=roots[0])
+                leaf.incorporate_results(probs, value, up_to=roots[0])
+            mcts.incorporate_batch(batches[1], [probs] * 4, values,
+                                   up_to=roots[1])
+        self.assertEqual(roots[0].N, roots[1].N)
+        self.assertEqualNPArray(roots[0].child_N, roots[1].child_N)
+        np.testing.assert_allclose(
+            roots[0].child_W, roots[1].child_W, atol=1e-5)
+        self.assertAlmostEqual(roots[0].W, roots[1].W, places=5)
+        self.assertNoPendingVirtualLosses(roots[1])
+
+    def test_select_leaf_records_path(self):
+        np.random.seed(1)
+        probs = np.random.random([go.N * go.N + 1]).astype(np.float32)
+        root = mcts.MCTSNode(go.Position())
+        root.select_leaf().incorporate_results(probs, 0.1, root)
+        for i in range(20):
+            root.select_leaf().incorporate_results(probs, 0.1, root)
+        leaf = root.select_leaf()
+        expected = []
+        node = leaf
+        while node is not root.parent:
+            expected.append((node, node.to_play))
+            node = node.parent
+        self.assertEqual(leaf._path(root), expected[::-1])
+
+        # Virtual loss and backup reuse the recorded path, rather than looking
+        # up to_play (a walk up the tree) at each node.
+        with mock.patch.object(mcts.MCTSNode, 'to_play') as mock_to_play:
+            leaf.add_virtual_loss(up_to=root)
+            mcts.incorporate_batch([leaf], [probs], [0.5], up_to=root)
+        self.assertEqual(mock_to_play.mock_calls, [])
+        self.assertIsNone(leaf._selected_path)
+        self.assertNoPendingVirtualLosses(root)
+
+        # A search from a child of up_to is extended upward.
+        child = root.children[expected[-2][0].fmove]
+        leaf = child.select_leaf()
+        path = leaf._path(root)
+        self.assertEqual(path[:2], [(root, go.BLACK), (child, go.WHITE)])
+        self.assertEqual(path[-1], (leaf, leaf.to_play))
+        leaf.revert_visits(up_to=root)
+
+    def assertCachedScoresMatch(self, root):
+        queue = [root]
+        while queue:
+            node = queue.pop()
+            queue.extend(node.children.values())
+            if not node.is_expanded:
+                continue
+            expected = node.child_action_score
+            cached = node._cached_action_score()
+            np.testing.assert_allclose(cached, expected, rtol=1e-5, atol=1e-5)
+            self.assertEqual(np.argmax(cached), np.argmax(expected))
+
+    def test_cached_action_score(self):
+        np.random.seed(1)
+        root = mcts.MCTSNode(SEND_TWO_RETURN_ONE)
+        probs = np.random.random([go.N * go.N + 1]).astype(np.float32)
+        root.select_leaf().incorporate_results(probs, 0.1, root)
+        root.inject_noise()
+        self.assertCachedScoresMatch(root)
+        for i in range(10):
+            leaves = []
+            for j in range(4):
+                leaf = root.select_leaf()
+                if leaf.is_done():
+                    leaf.revert_visits(up_to=root)
+                    continue
+                leaf.add_virtual_loss(up_to=root)
+                leaves.append(leaf)
+            self.assertCachedScoresMatch(root)
+            probs = np.random.random([len(leaves), go.N * go.N + 1])
+            values = np.random.random([len(leaves)]) * 2 - 1
+            if i % 2:
+                mcts.incorporate_batch(leaves, probs, values, up_to=root)
+            else:
+                for leaf, move_probs, value in zip(leaves, probs, values):
+                    leaf.revert_virtual_loss(up_to=root)
+                    leaf.incorporate_results(move_probs, value, up_to=root)
+            self.assertCachedScoresMatch(root)
+
+    def test_cached_action_score_setters(self):
+        probs = np.array([.02] * (go.N * go.N + 1))
+        root = mcts.MCTSNode(go.Position())
+        root.select_leaf().incorporate_results(probs, 0, root)
+        child = root.maybe_add_child(3)
+        child.N = 10
+        child.W = 7
+        self.assertCachedScoresMatch(root)
+        self.assertEqual(np.argmax(root._cached_action_score()), 3)
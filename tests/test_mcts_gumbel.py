@@ -0,0 +1,79 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+import go
+import mcts
+import mcts_gumbel
+from tests import test_utils
+from tests.test_mcts import SEND_TWO_RETURN_ONE
+
+
+def expanded_root(position=None):
+    probs = np.array([.02] * (go.N * go.N + 1))
+    root = mcts.MCTSNode(position or go.Position())
+    root.select_leaf().incorporate_results(probs, 0, root)
+    return root
+
+
+class TestGumbelSearch(test_utils.MiniGoUnitTest):
+    def test_improved_policy(self):
+        root = expanded_root(SEND_TWO_RETURN_ONE)
+        self.assertEqual(root.to_play, go.WHITE)
+        legal = SEND_TWO_RETURN_ONE.all_legal_moves()
+        good, bad = np.flatnonzero(legal)[:2]
+        # Good for white, bad for white.
+        root.maybe_add_child(good).N = 2
+        root.maybe_add_child(good).W = -2
+        root.maybe_add_child(bad).N = 2
+        root.maybe_add_child(bad).W = 2
+
+        pi = mcts_gumbel.improved_policy(root)
+        self.assertAlmostEqual(np.sum(pi), 1)
+        self.assertTrue(np.all(pi[legal == 0] == 0))
+        other = np.flatnonzero(legal)[2]
+        self.assertGreater(pi[good], pi[other])
+        self.assertGreater(pi[other], pi[bad])
+
+    def test_sequential_halving(self):
+        np.random.seed(1)
+        root = expanded_root()
+        halving = mcts_gumbel.SequentialHalving(
+            root, num_readouts=32, max_considered=8)
+        self.assertEqual(halving.num_rounds, 3)
+        self.assertEqual(len(set(halving.considered)), 8)
+        # Only the runner-up by Gumbel noise and prior wins.
+        target = halving.considered[1]
+
+        num_considered = []
+        for i in range(32):
+            move = halving.next_move()
+            self.assertIn(move, halving.considered)
+            num_considered.append(len(halving.considered))
+            child = root.maybe_add_child(move)
+            child.N += 1
+            child.W += 1 if move == target else -1
+        self.assertEqual(num_considered, [8] * 8 + [4] * 8 + [2] * 16)
+        self.assertIn(target, halving.considered)
+        self.assertEqual(halving.best_move(), target)
+
+    def test_few_legal_moves(self):
+        root = expanded_root(SEND_TWO_RETURN_ONE)
+        num_legal = np.count_nonzero(SEND_TWO_RETURN_ONE.all_legal_moves())
+        halving = mcts_gumbel.SequentialHalving(
+            root, num_readouts=10, max_considered=100)
+        self.assertEqual(len(halving.considered), num_legal)
+        for i in range(10):
+            self.assertEqual(root.illegal_moves[halving.next_move()], 0)
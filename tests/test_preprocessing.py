@@ -120,6 +120,41 @@ class TestPreprocessing(test_utils.MiniGoUnitTest):
             )]
         self.assertEqualData(expected_data, recovered_data)
 
+    def test_game_record_round_trip(self):
+        np.random.seed(1)
+        moves = []
+        position = go.Position()
+        for move in [(2, 2), (2, 3), None, (3, 3), (6, 6), (0, 0)]:
+            moves.append(go.PlayerMove(position.to_play, move))
+            position = position.play_move(move)
+        training_pis = []
+        for i in (0, 2, 3, 5):
+            pi = np.random.random([go.N * go.N + 1]).astype(np.float32)
+            pi[pi < 0.8] = 0
+            pi[coords.to_flat(moves[i].move)] = 1
+            training_pis.append((i, pi / np.sum(pi)))
+        tf_example = preprocessing.make_game_record(
+            moves, training_pis, go.WHITE, 7.5)
+        record = preprocessing.parse_game_record(
+            tf_example.SerializeToString())
+        self.assertEqual(record.result, go.WHITE)
+        self.assertEqual(record.komi, 7.5)
+        self.assertEqualNPArray(record.example_moves, [0, 2, 3, 5])
+
+        tf_examples = preprocessing.make_examples_from_game_record(
+            record, [3, 1])
+        with tempfile.NamedTemporaryFile() as f:
+            preprocessing.write_tf_examples(f.name, tf_examples)
+            recovered_data = self.extract_data(f.name)
+
+        game_features = features.extract_game_features(moves)
+        self.assertEqual(len(recovered_data), 2)
+        for (x, pi, value), i in zip(recovered_data, [3, 1]):
+            move_number, expected_pi = training_pis[i]
+            self.assertEqualNPArray(x[0], game_features[move_number])
+            self.assertTrue(np.allclose(pi[0], expected_pi, atol=1e-4))
+            self.assertEqual(value, go.WHITE)
+
     def test_rotate_pyfunc(self):
         def reset_random():
             random.seed(1)
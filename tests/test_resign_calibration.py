@@ -0,0 +1,77 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import go
+import resign_calibration
+import sgf_wrapper
+from tests import test_utils
+
+
+def make_game(qs, result, resign_threshold=-1):
+    moves = [go.PlayerMove(go.BLACK if i % 2 == 0 else go.WHITE, None)
+             for i in range(len(qs))]
+    comments = ["{:.4f}\nmore stats".format(q) for q in qs]
+    comments[0] = ("Resign Threshold: %0.3f\n" % resign_threshold) + comments[0]
+    return sgf_wrapper.make_sgf(moves, result, comments=comments)
+
+
+class TestResignCalibration(test_utils.MiniGoUnitTest):
+    def test_parse_sgf(self):
+        sgf = make_game([0.1, -0.6, -0.2, 0.5], 'B+R', resign_threshold=-0.9)
+        threshold, winner, qs = resign_calibration.parse_sgf(sgf)
+        self.assertEqual(threshold, -0.9)
+        self.assertEqual(winner, go.BLACK)
+        # The first comment starts with the resign threshold.
+        self.assertEqual(qs, [-0.6, -0.2, 0.5])
+        self.assertIsNone(resign_calibration.parse_sgf('(;GM[1])'))
+
+    def test_is_resign_disabled(self):
+        sgf = make_game([0.1, -0.6], 'B+R')
+        self.assertTrue(resign_calibration.is_resign_disabled(
+            sgf[:resign_calibration.HEADER_LENGTH]))
+        sgf = make_game([0.1, -0.6], 'B+R', resign_threshold=-0.9)
+        self.assertFalse(resign_calibration.is_resign_disabled(
+            sgf[:resign_calibration.HEADER_LENGTH]))
+        self.assertFalse(resign_calibration.is_resign_disabled('(;GM[1]'))
+
+    def test_worst_winner_q(self):
+        qs = [0.1, -0.6, 0.7]
+        self.assertEqual(resign_calibration.worst_winner_q(go.BLACK, qs), -0.6)
+        self.assertEqual(resign_calibration.worst_winner_q(go.WHITE, qs), -0.7)
+
+    def test_calibrate(self):
+        worst_qs = [-0.99, -0.97, -0.95, -0.9, -0.85,
+                    -0.8, -0.75, -0.7, -0.65, -0.6]
+        calibrate = resign_calibration.calibrate
+        self.assertEqual(calibrate(worst_qs, 0, min_games=10), -0.99)
+        # One in ten games (the -0.99 one) would resign falsely.
+        self.assertEqual(calibrate(worst_qs, 0.1, min_games=10), -0.97)
+        self.assertEqual(calibrate(worst_qs, 0.25, min_games=10), -0.95)
+        self.assertEqual(calibrate(worst_qs, 1, min_games=10),
+                         resign_calibration.MAX_THRESHOLD)
+        self.assertIsNone(calibrate(worst_qs, 0.1, min_games=11))
+
+    def test_calibrate_from_sgfs(self):
+        games = [
+            make_game([0.1, -0.2, -0.95, 0.5], 'B+3.5'),
+            make_game([0.1, 0.2, 0.8, -0.5], 'W+R'),
+            # Resign was enabled in this game, so it doesn't count.
+            make_game([0.1, 0.2, 0.99, 0.5], 'B+R', resign_threshold=-0.9),
+        ]
+        self.assertEqual(resign_calibration.calibrate_from_sgfs(
+            games, 0, min_games=2), -0.95)
+        self.assertEqual(resign_calibration.calibrate_from_sgfs(
+            games, 0.5, min_games=2), -0.8)
+        self.assertIsNone(resign_calibration.calibrate_from_sgfs(
+            games, 0.5, min_games=3))
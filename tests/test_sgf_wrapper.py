@@ -13,7 +13,7 @@
 # limitations under the License.
 
 import go
-from sgf_wrapper import replay_sgf, translate_sgf_move, make_sgf
+from sgf_wrapper import replay_sgf, read_sgf_moves, translate_sgf_move, make_sgf
 import unittest
 
 import coords
@@ -59,6 +59,17 @@ class TestSgfGeneration(test_utils.MiniGoUnitTest):
 
 
 class TestSgfWrapper(test_utils.MiniGoUnitTest):
+    def test_read_sgf_moves(self):
+        for sgf_contents in (JAPANESE_HANDICAP_SGF, CHINESE_HANDICAP_SGF):
+            pwcs = list(replay_sgf(sgf_contents))
+            board, moves, result = read_sgf_moves(sgf_contents)
+            self.assertEqualNPArray(board, pwcs[0].position.board)
+            self.assertEqual([move for _, move in moves],
+                             [pwc.next_move for pwc in pwcs])
+            self.assertEqual([color for color, _ in moves],
+                             [pwc.position.to_play for pwc in pwcs])
+            self.assertEqual(result, pwcs[0].result)
+
     def test_sgf_props(self):
         sgf_replayer = replay_sgf(CHINESE_HANDICAP_SGF)
         initial = next(sgf_replayer)
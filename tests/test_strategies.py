@@ -12,17 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
+import time
 import unittest
 import unittest.mock as mock
 import numpy as np
 
 from absl import flags
+from absl.testing import flagsaver
 
 import coords
+import features
 import go
+import mcts
+import sgf_wrapper
 from go import Position
 from tests import test_utils
-from strategies import MCTSPlayer, time_recommendation
+from strategies import MCTSPlayer, kl_divergence, time_recommendation
 
 ALMOST_DONE_BOARD = test_utils.load_board('''
 .XO.XO.OO
@@ -78,6 +84,16 @@ class DummyNet():
         return [self.fake_priors] * len(positions), [self.fake_value] * len(positions)
 
 
+class CountingNet(DummyNet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.positions_evaluated = 0
+
+    def run_many(self, positions):
+        self.positions_evaluated += len(positions)
+        return super().run_many(positions)
+
+
 def initialize_basic_player():
     player = MCTSPlayer(DummyNet())
     player.initialize_game()
@@ -98,6 +114,24 @@ def initialize_almost_done_player():
     return player
 
 
+class PositionNet(DummyNet):
+    "Returns priors and values that differ from one position to another."
+
+    def run_many(self, positions):
+        if not positions:
+            raise ValueError(
+                "No positions passed! (Tensorflow would have failed here.")
+        priors, values = [], []
+        for position in positions:
+            rng = np.random.RandomState(
+                int(np.sum(position.board * np.arange(go.N))) % 1000 +
+                1000 * position.n)
+            probs = rng.random_sample(go.N * go.N + 1).astype(np.float32)
+            priors.append(probs / np.sum(probs))
+            values.append(rng.uniform(-1, 1))
+        return priors, values
+
+
 class TestMCTSPlayer(test_utils.MiniGoUnitTest):
     def test_time_controls(self):
         secs_per_move = 5
@@ -247,6 +281,23 @@ class TestMCTSPlayer(test_utils.MiniGoUnitTest):
         # 0.085 = average(0, 0.17), since 0 is the prior on the root.
         self.assertAlmostEqual(player.root.Q, 0.085)
 
+    def test_tree_search_deduplicates_leaves(self):
+        player = MCTSPlayer(CountingNet(fake_value=0.17))
+        player.initialize_game()
+        # Every selection on an empty tree returns the root, which is only
+        # sent to the network once.
+        leaves = player.tree_search(parallel_readouts=4)
+        self.assertEqual(leaves, [player.root])
+        self.assertEqual(player.network.positions_evaluated, 1)
+        self.assertNoPendingVirtualLosses(player.root)
+
+        # Collisions are replaced by further selections to fill the batch.
+        leaves = player.tree_search(parallel_readouts=8)
+        self.assertEqual(len(set(leaves)), 8)
+        self.assertEqual(player.network.positions_evaluated, 9)
+        self.assertEqual(player.root.N, 9)
+        self.assertNoPendingVirtualLosses(player.root)
+
     def test_tree_search_failsafe(self):
         # Test that the failsafe works correctly. It can trigger if the MCTS
         # repeatedly visits a finished game state.
@@ -282,6 +333,15 @@ class TestMCTSPlayer(test_utils.MiniGoUnitTest):
         # check that we didn't visit the pass node any more times.
         self.assertEqual(player.root.child_N[pass_move], 1)
 
+    def test_play_illegal_move(self):
+        player = initialize_basic_player()
+        self.assertTrue(player.play_move((0, 0)))
+        self.assertFalse(player.play_move((0, 0)))
+        self.assertEqual(player.root.position.n, 1)
+        self.assertEqual(len(player.searches_pi), 1)
+        self.assertEqual(len(player.qs), 1)
+        self.assertEqual(len(player.comments), 1)
+
     def test_extract_data_normal_end(self):
         player = MCTSPlayer(DummyNet())
         player.initialize_game()
@@ -318,3 +378,373 @@ class TestMCTSPlayer(test_utils.MiniGoUnitTest):
         # Result should say White is the winner
         self.assertEqual(result, go.WHITE)
         self.assertEqual(player.result_string, "W+R")
+
+    def test_extract_data_skips_fast_moves(self):
+        player = MCTSPlayer(DummyNet())
+        player.initialize_game()
+        player.tree_search()
+        player.play_move((0, 0))
+        player.tree_search()
+        player.play_move((0, 1), for_training=False)
+        player.tree_search()
+        player.play_move(None)
+        player.tree_search()
+        player.play_move(None)
+        self.assertEqual(player.training_moves, [True, False, True, True])
+        player.set_result(player.root.position.result(), was_resign=False)
+
+        data = list(player.extract_data())
+        self.assertEqual(len(data), 3)
+        self.assertEqual([position.n for position, pi, result in data],
+                         [0, 2, 3])
+
+    def test_position_cache_same_search(self):
+        with flagsaver.flagsaver(position_cache_size=4):
+            player = initialize_almost_done_player()
+            for i in range(10):
+                player.tree_search(parallel_readouts=4)
+            self.assertLessEqual(len(player.position_cache), 4)
+        reference = initialize_almost_done_player()
+        self.assertIsNone(reference.position_cache)
+        for i in range(10):
+            reference.tree_search(parallel_readouts=4)
+        self.assertEqualNPArray(player.root.child_N, reference.root.child_N)
+        self.assertEqualNPArray(player.root.child_W, reference.root.child_W)
+        self.assertNoPendingVirtualLosses(player.root)
+
+    def test_max_tree_nodes(self):
+        player = MCTSPlayer(DummyNet(), max_tree_nodes=20)
+        player.initialize_game()
+        for i in range(20):
+            player.tree_search(parallel_readouts=4)
+            self.assertLessEqual(player.get_tree_size(), 20)
+        self.assertGreaterEqual(player.root.N, 60)
+        self.assertNoPendingVirtualLosses(player.root)
+
+    @flagsaver.flagsaver(undo_depth=8)
+    def test_max_tree_nodes_counts_undo(self):
+        player = MCTSPlayer(DummyNet(), max_tree_nodes=40)
+        player.initialize_game()
+        first_root = player.root
+        for i in range(6):
+            for j in range(5):
+                player.tree_search(parallel_readouts=4)
+                self.assertLessEqual(player.get_tree_size(), 40)
+                # Besides the budget, only the roots of the moves played
+                # are kept.
+                self.assertLessEqual(first_root.tree_size(), 40 + i)
+            player.play_move(player.pick_move())
+        # The search of the current move has pushed out the subtrees of the
+        # moves not played.
+        self.assertLess(len(player._undo_roots), 6)
+        for i in range(6):
+            self.assertTrue(player.undo())
+        self.assertFalse(player.undo())
+        self.assertNoPendingVirtualLosses(player.root)
+
+    def test_transposition_table(self):
+        with flagsaver.flagsaver(transposition_table_size=100):
+            player = MCTSPlayer(CountingNet())
+        player.initialize_game()
+        root = player.root
+        leaves = []
+        for moves in [(0, 1, 2), (2, 1, 0), (0, 3, 2)]:
+            node = root
+            for move in moves:
+                node = node.maybe_add_child(move)
+            leaves.append(node)
+        # Both move orders of 0, 1, 2 lead to the same position.
+        player.evaluate_positions([leaf.position for leaf in leaves])
+        self.assertEqual(player.network.positions_evaluated, 2)
+        player.evaluate_positions([leaves[1].position])
+        self.assertEqual(player.network.positions_evaluated, 2)
+
+        reference = MCTSPlayer(CountingNet())
+        reference.initialize_game()
+        self.assertIsNone(reference.transpositions)
+        player.network.positions_evaluated = 0
+        for i in range(20):
+            player.tree_search(parallel_readouts=4)
+            reference.tree_search(parallel_readouts=4)
+        self.assertEqualNPArray(player.root.child_N, reference.root.child_N)
+        self.assertLessEqual(player.network.positions_evaluated,
+                             reference.network.positions_evaluated)
+
+    def test_early_stop(self):
+        probs = np.array([.001] * (go.N * go.N + 1))
+        probs[coords.to_flat((2, 2))] = 0.9
+        with flagsaver.flagsaver(early_stop=True):
+            player = MCTSPlayer(DummyNet(fake_priors=probs),
+                                two_player_mode=True, num_readouts=200)
+            player.initialize_game()
+            readouts = player.search()
+            self.assertLess(readouts, 200)
+            self.assertEqual(player.root.N, readouts)
+            move = player.pick_move()
+
+            # Moves that are softpicked always get the full search.
+            softpicked = MCTSPlayer(DummyNet(fake_priors=probs),
+                                    num_readouts=200)
+            softpicked.initialize_game()
+            self.assertGreaterEqual(softpicked.search(), 200)
+            self.assertNoPendingVirtualLosses(player.root)
+
+        reference = MCTSPlayer(DummyNet(fake_priors=probs),
+                               two_player_mode=True, num_readouts=200)
+        reference.initialize_game()
+        self.assertGreaterEqual(reference.search(), 200)
+        self.assertEqual(move, reference.pick_move())
+
+    def test_early_stop_kl(self):
+        with flagsaver.flagsaver(early_stop_kl=0.05):
+            player = MCTSPlayer(DummyNet(), two_player_mode=True,
+                                num_readouts=400)
+            player.initialize_game()
+            self.assertLess(player.search(), 400)
+            self.assertNoPendingVirtualLosses(player.root)
+
+    def test_kl_divergence(self):
+        p = np.array([0.5, 0.5, 0])
+        self.assertEqual(kl_divergence(p, p), 0)
+        self.assertAlmostEqual(kl_divergence(p, np.array([0.25, 0.5, 0.25])),
+                               0.5 * np.log(2))
+        self.assertEqual(kl_divergence(p, np.array([1, 0, 0])), np.inf)
+
+    def test_gumbel_search(self):
+        np.random.seed(1)
+        player = MCTSPlayer(DummyNet(), gumbel_search=True, num_readouts=32)
+        player.initialize_game()
+        self.assertGreaterEqual(player.search(), 32)
+        self.assertNoPendingVirtualLosses(player.root)
+        considered = player.halving.considered
+        self.assertEqual(len(considered), 2)
+        # Root visits are only spent on the sampled moves.
+        self.assertEqual(np.count_nonzero(player.root.child_N), 16)
+
+        move = player.pick_move()
+        self.assertIn(coords.to_flat(move), considered)
+        self.assertTrue(player.play_move(move))
+        self.assertIsNone(player.halving)
+        pi = player.searches_pi[0]
+        self.assertAlmostEqual(np.sum(pi), 1)
+        self.assertTrue(np.all(pi > 0))
+
+    def test_set_result_adjudicated(self):
+        player = initialize_basic_player()
+        player.set_result(go.WHITE, was_resign=False, was_adjudicated=True)
+        self.assertEqual(player.result, go.WHITE)
+        self.assertEqual(player.result_string, "W+Adj")
+        self.assertTrue(player.is_done())
+
+    def test_pondering(self):
+        player = initialize_basic_player()
+        player.start_pondering()
+        deadline = time.time() + 10
+        while player.root.N < 20 and time.time() < deadline:
+            time.sleep(0.001)
+        player.stop_pondering()
+        pondered = player.root.N
+        self.assertGreaterEqual(pondered, 20)
+        self.assertNoPendingVirtualLosses(player.root)
+        # Nothing searches once pondering has stopped.
+        time.sleep(0.01)
+        self.assertEqual(player.root.N, pondered)
+
+        # The pondered readouts are reused after the move is played.
+        move = player.pick_move()
+        child_N = player.root.child_N[coords.to_flat(move)]
+        player.play_move(move)
+        self.assertEqual(player.root.N, child_N)
+        player.stop_pondering()  # Stopping twice is fine.
+
+    def test_search_until(self):
+        player = initialize_basic_player()
+        # Out of time: still search once.
+        self.assertGreater(player.search_until(0), 0)
+
+        player = initialize_basic_player()
+        with mock.patch.object(player, 'root_is_unstable', return_value=True):
+            start = time.time()
+            player.search_until(start, start + 0.05)
+            self.assertGreaterEqual(time.time() - start, 0.05)
+
+    def test_suggest_move_under_time_controls(self):
+        player = initialize_basic_player()
+        player.time_manager.set_time_settings(60, 0, 0)
+        with mock.patch.object(player, 'search_until',
+                               side_effect=lambda *args: player.search(16)
+                               ) as search_until:
+            player.suggest_move(player.root.position)
+        deadline, hard_deadline = search_until.call_args[0]
+        self.assertLess(deadline, hard_deadline)
+        self.assertLess(hard_deadline, time.time() + 60)
+        time_left, stones = player.time_manager.clock[go.BLACK]
+        self.assertLess(time_left, 60)
+        self.assertEqual(stones, 0)
+
+    def test_undo(self):
+        player = initialize_basic_player()
+        self.assertFalse(player.undo())
+
+        player.search(32)
+        first_root = player.root
+        searched = first_root.N
+        child_N = first_root.child_N.copy()
+        move = player.pick_move()
+        player.play_move(move)
+        self.assertTrue(player.undo())
+        self.assertIs(player.root, first_root)
+        self.assertEqual(player.root.N, searched)
+        self.assertEqualNPArray(player.root.child_N, child_N)
+        self.assertEqual(len(player.searches_pi), 0)
+        self.assertEqual(len(player.qs), 0)
+        self.assertEqual(len(player.comments), 0)
+
+        # Replaying the move reuses its subtree.
+        child = first_root.children[coords.to_flat(move)]
+        player.play_move(move)
+        self.assertIs(player.root, child)
+
+    def test_initialize_game_history(self):
+        history = [go.Position()]
+        history.append(history[-1].play_move((0, 0)))
+        # White passes in the record without a move: black plays again.
+        history.append(history[-1].play_move((1, 1)))
+        history[-1].flip_playerturn(mutate=True)
+        history.append(history[-1].play_move((2, 2)))
+        position = history[-1].play_move((3, 3))
+        player = MCTSPlayer(DummyNet())
+        player.initialize_game(position, history)
+        self.assertIs(player.root.position, position)
+
+        for expected in reversed(history):
+            self.assertTrue(player.undo())
+            replayed = player.root.position
+            self.assertEqual(replayed.n, expected.n)
+            self.assertEqual(replayed.to_play, expected.to_play)
+            self.assertEqual(player.root.to_play, expected.to_play)
+            self.assertEqualNPArray(replayed.board, expected.board)
+        self.assertFalse(player.undo())
+
+        # Setup stones don't add a move: the history starts after them.
+        setup = sgf_wrapper.add_stones(history[2], [(5, 5)], [])
+        position = setup.play_move((6, 6))
+        player.initialize_game(position, history[:3] + [setup])
+        self.assertTrue(player.undo())
+        self.assertEqualNPArray(player.root.position.board, setup.board)
+        self.assertFalse(player.undo())
+
+    def play_seeded_game(self, player, num_moves):
+        np.random.seed(1)
+        random.seed(1)
+        player.initialize_game()
+        for i in range(num_moves):
+            player.search(24)
+            player.play_move(player.pick_move())
+        return player.searches_pi
+
+    def test_stats_pool(self):
+        num_moves = 12
+        player = MCTSPlayer(PositionNet(), num_readouts=24)
+        self.assertIsNone(player.stats_pool)
+        expected_pis = self.play_seeded_game(player, num_moves)
+        expected_root = player.root
+
+        with flagsaver.flagsaver(stats_pool_block=16):
+            player = MCTSPlayer(PositionNet(), num_readouts=24)
+        pool = player.stats_pool
+        pis = self.play_seeded_game(player, num_moves)
+        # The pool changes where the statistics are stored, not the search.
+        self.assertEqual(len(pis), num_moves)
+        for pi, expected_pi in zip(pis, expected_pis):
+            self.assertEqualNPArray(pi, expected_pi)
+        self.assertEqualNPArray(player.root.child_N, expected_root.child_N)
+        self.assertEqualNPArray(player.root.child_W, expected_root.child_W)
+        self.assertEqualNPArray(player.root.child_prior,
+                                expected_root.child_prior)
+
+        # The rows of the subtrees discarded by each move are reused: the
+        # pool holds far fewer rows than the nodes expanded during the game.
+        capacity = pool.capacity
+        self.assertLess(capacity, num_moves * 24 / 2)
+        # A new game reuses all of them.
+        self.play_seeded_game(player, num_moves)
+        self.assertEqual(pool.capacity, capacity)
+
+        # Pruned subtrees give their rows back too.
+        player.search(64)
+        in_use = pool.capacity - pool.num_free
+        player.root.prune_subtrees(8)
+        self.assertLess(pool.capacity - pool.num_free, in_use)
+
+    @flagsaver.flagsaver(undo_depth=1)
+    def test_undo_depth(self):
+        player = initialize_basic_player()
+        player.search(32)
+        first_root = player.root
+        num_children = len(first_root.children)
+        self.assertGreater(num_children, 1)
+        player.play_move(player.pick_move())
+        self.assertEqual(len(first_root.children), num_children)
+        player.search(32)
+        player.play_move(player.pick_move())
+        # Only the move played is kept beyond undo_depth moves.
+        self.assertEqual(len(first_root.children), 1)
+
+        self.assertTrue(player.undo())
+        self.assertTrue(player.undo())
+        self.assertIs(player.root, first_root)
+        self.assertFalse(player.undo())
+
+    def test_lazy_comments(self):
+        player = initialize_basic_player()
+        player.search(16)
+        description = player.root.describe()
+        player.play_move(player.pick_move())
+        self.assertEqual(player.move_stats[0].children.dtype,
+                         mcts.CHILD_STATS_DTYPE)
+        self.assertEqual(player.comments, [description])
+        self.assertEqual(description.split("\n")[0],
+                         "{:.4f}".format(player.qs[0]))
+
+    @flagsaver.flagsaver(sgf_comments=False)
+    def test_no_sgf_comments(self):
+        player = initialize_basic_player()
+        player.search(16)
+        player.play_move(player.pick_move())
+        self.assertEqual(player.move_stats, [None])
+        self.assertEqual(player.comments, ["{:.4f}".format(player.qs[0])])
+
+    def test_extract_data_snapshots(self):
+        player = MCTSPlayer(DummyNet())
+        player.initialize_game()
+        for move in [(0, 0), (0, 1), (1, 1), (1, 0), (0, 2), None]:
+            player.tree_search()
+            player.play_move(move)
+        player.set_result(go.BLACK, was_resign=True)
+
+        data = list(player.extract_data())
+        replayed = list(go.replay_position(player.root.position, go.BLACK))
+        self.assertEqual(len(data), len(replayed))
+        for (snapshot, _, result), pwc in zip(data, replayed):
+            self.assertEqual(snapshot.n, pwc.position.n)
+            self.assertEqual(result, pwc.result)
+            self.assertEqualNPArray(features.extract_features(snapshot),
+                                    features.extract_features(pwc.position))
+
+    def test_extract_game_record(self):
+        player = MCTSPlayer(DummyNet())
+        player.initialize_game()
+        for move in [(0, 0), (0, 1), (1, 1), (1, 0), None]:
+            player.tree_search()
+            player.play_move(move, for_training=move != (0, 1))
+        player.set_result(go.WHITE, was_resign=True)
+
+        moves, training_pis, result, komi = player.extract_game_record()
+        self.assertEqual(moves, player.root.position.recent)
+        self.assertEqual([i for i, _ in training_pis], [0, 2, 3, 4])
+        for (_, pi), (_, data_pi, _) in zip(training_pis,
+                                             player.extract_data()):
+            self.assertIs(pi, data_pi)
+        self.assertEqual(result, go.WHITE)
+        self.assertEqual(komi, player.root.position.komi)
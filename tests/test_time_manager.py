@@ -0,0 +1,85 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import go
+import time_manager
+from tests import test_utils
+
+
+class TestTimeManager(test_utils.MiniGoUnitTest):
+    def test_no_time_controls(self):
+        manager = time_manager.TimeManager()
+        self.assertIsNone(manager.budget(go.BLACK, 0))
+        # Byo-yomi time without stones means no time limit in GTP.
+        manager.set_time_settings(0, 10, 0)
+        self.assertIsNone(manager.budget(go.BLACK, 0))
+
+    def test_absolute_time_lasts_the_game(self):
+        manager = time_manager.TimeManager()
+        manager.set_time_settings(600, 0, 0)
+        total = 0
+        for move_number in range(0, 1000, 2):
+            target, limit = manager.budget(go.BLACK, move_number)
+            self.assertLessEqual(target, limit)
+            manager.record_move(go.BLACK, limit, 100)
+            total += limit
+        self.assertLess(total, 600)
+        # The opponent's clock is separate.
+        self.assertEqual(manager.clock[go.WHITE], (600, 0))
+
+    def test_uses_the_clock(self):
+        manager = time_manager.TimeManager()
+        manager.set_time_settings(600, 0, 0)
+        used = 0
+        for move_number in range(0, time_manager.EXPECTED_GAME_LENGTH, 2):
+            target, _ = manager.budget(go.BLACK, move_number)
+            manager.record_move(go.BLACK, target, 100)
+            used += target
+        self.assertGreater(used, 600 * 0.5)
+
+    def test_byo_yomi(self):
+        manager = time_manager.TimeManager()
+        manager.set_time_settings(0, 50, 5)
+        target, limit = manager.budget(go.BLACK, 0)
+        self.assertEqual(target, limit)
+        self.assertLess(target, 10)
+        self.assertGreater(target, 5)
+
+        for _ in range(5):
+            manager.record_move(go.BLACK, 9, 100)
+        # A new period starts after 5 stones.
+        self.assertEqual(manager.clock[go.BLACK], (50, 5))
+
+        # time_left overrides the local clock.
+        manager.set_time_left(go.BLACK, 4, 2)
+        target, limit = manager.budget(go.BLACK, 100)
+        self.assertLess(limit, 2)
+
+    def test_main_time_overflows_into_byo_yomi(self):
+        manager = time_manager.TimeManager()
+        manager.set_time_settings(10, 30, 3)
+        manager.record_move(go.WHITE, 15, 100)
+        self.assertEqual(manager.clock[go.WHITE], (25, 2))
+
+    def test_reused_readouts(self):
+        manager = time_manager.TimeManager()
+        manager.set_time_settings(600, 0, 0)
+        manager.record_move(go.WHITE, 1, 1000)
+        fresh, _ = manager.budget(go.BLACK, 0)
+        reused, _ = manager.budget(go.BLACK, 0, reused_readouts=1000)
+        self.assertLess(reused, fresh)
+        self.assertGreaterEqual(
+            reused + time_manager.LAG_SECONDS,
+            (fresh + time_manager.LAG_SECONDS) *
+            (1 - time_manager.MAX_REUSE_SAVING) - 1e-9)
@@ -0,0 +1,151 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time management under GTP time controls.
+
+The clock is set by the GTP time_settings command (main time, then Canadian
+byo-yomi: byo_yomi_stones moves in each byo_yomi_time period) and corrected
+by time_left. Between time_left updates, the time used by each move is
+deducted locally.
+
+Each move gets a share of the main time spread over the moves we expect to
+play, plus a safe share of the byo-yomi period. Readouts already in the tree,
+from a previous move or from pondering, count toward that share. If the root
+is unstable when the target runs out, the search may go on up to a hard limit.
+"""
+
+import go
+
+# We expect a game to last this many moves, of which we play half.
+EXPECTED_GAME_LENGTH = int(go.N * go.N * 0.7)
+
+# Always keep enough main time for at least this many of our moves.
+MIN_MOVES_LEFT = go.N
+
+# Seconds kept back from every move for network and GTP lag.
+LAG_SECONDS = 0.5
+
+# Fraction of the byo-yomi time per stone that a move may use.
+BYOYOMI_SAFETY = 0.8
+
+# An unstable search may go on up to this many times its target...
+MAX_EXTENSION = 2.5
+# ... but never beyond this fraction of the main time left.
+MAX_MAIN_TIME_FRACTION = 0.25
+
+# Readouts reused from the previous move save at most this fraction of the
+# target time.
+MAX_REUSE_SAVING = 0.5
+
+# Weight of the last move in the running estimate of readouts per second.
+RATE_DECAY = 0.3
+
+
+class TimeManager(object):
+    """Keeps both players' clocks and budgets the time of each of our moves.
+
+    Without time controls (no time_settings, or all zero), budget returns None.
+    """
+
+    def __init__(self):
+        self.set_time_settings(0, 0, 0)
+        self.readouts_per_second = None
+
+    def set_time_settings(self, main_time, byo_yomi_time, byo_yomi_stones):
+        "Handles GTP time_settings, and restarts both clocks."
+        self.main_time = main_time
+        self.byo_yomi_time = byo_yomi_time
+        self.byo_yomi_stones = byo_yomi_stones
+        # color -> (seconds left, stones left in the byo-yomi period). Zero
+        # stones means the player is still in main time, as in GTP time_left.
+        self.clock = {color: (main_time, 0)
+                      for color in (go.BLACK, go.WHITE)}
+        if main_time == 0 and byo_yomi_stones > 0:
+            self.clock = {color: (byo_yomi_time, byo_yomi_stones)
+                          for color in (go.BLACK, go.WHITE)}
+
+    def set_time_left(self, color, time_left, stones):
+        "Handles GTP time_left."
+        self.clock[color] = (time_left, stones)
+
+    @property
+    def has_time_controls(self):
+        # In GTP, byo-yomi time without byo-yomi stones means no time limit.
+        return self.main_time > 0 or self.byo_yomi_stones > 0
+
+    def budget(self, color, move_number, reused_readouts=0):
+        """Returns the time that color should spend on its move.
+
+        Args:
+            move_number: the number of moves played so far.
+            reused_readouts: the readouts already in the tree.
+        Returns:
+            (target, limit) in seconds: the search should stop after target
+            seconds if its result is stable, and after limit seconds in any
+            case. None if there are no time controls.
+        """
+        if not self.has_time_controls:
+            return None
+        time_left, stones = self.clock[color]
+        if self.byo_yomi_stones > 0:
+            period_time = self.byo_yomi_time / self.byo_yomi_stones
+        else:
+            period_time = 0
+        if stones > 0:
+            # In byo-yomi: only this period's time is ours to spend.
+            target = time_left / stones * BYOYOMI_SAFETY
+            limit = target
+        else:
+            moves_left = max(MIN_MOVES_LEFT,
+                             (EXPECTED_GAME_LENGTH - move_number) / 2)
+            target = time_left / moves_left + period_time * BYOYOMI_SAFETY
+            limit = min(target * MAX_EXTENSION,
+                        time_left * MAX_MAIN_TIME_FRACTION +
+                        period_time * BYOYOMI_SAFETY)
+            limit = max(target, limit)
+        if reused_readouts and self.readouts_per_second:
+            expected = target * self.readouts_per_second
+            saving = min(reused_readouts / expected, MAX_REUSE_SAVING)
+            target *= 1 - saving
+        target = max(0, target - LAG_SECONDS)
+        limit = max(target, limit - LAG_SECONDS)
+        return target, limit
+
+    def record_move(self, color, seconds, readouts):
+        """Deducts the time used by a move of color from its clock, and updates
+        the estimate of readouts per second."""
+        if seconds > 0 and readouts > 0:
+            rate = readouts / seconds
+            if self.readouts_per_second is None:
+                self.readouts_per_second = rate
+            else:
+                self.readouts_per_second += RATE_DECAY * (
+                    rate - self.readouts_per_second)
+        if not self.has_time_controls:
+            return
+        time_left, stones = self.clock[color]
+        time_left -= seconds
+        if stones == 0:
+            if time_left <= 0 and self.byo_yomi_stones > 0:
+                # Main time ran out during the move: the overflow is
+                # counted against the first byo-yomi period.
+                time_left += self.byo_yomi_time
+                stones = self.byo_yomi_stones
+            else:
+                self.clock[color] = (max(0, time_left), 0)
+                return
+        stones -= 1
+        if stones == 0:
+            time_left, stones = self.byo_yomi_time, self.byo_yomi_stones
+        self.clock[color] = (max(0, time_left), stones)